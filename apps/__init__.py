@@ -1,45 +1,49 @@
 """
 Flask web application for facility-reserv.
+Importing the package is kept light, since apps.worker, apps.poller and apps.manage import its modules as well.
+Flask app modules are imported by create_app(), and gevent patching is done by the web server entrypoint.
 MAINTAINER: Ra Daesung (daesungra@gmail.com)
 """
 
-from gevent import monkey
-monkey.patch_all()
-
 import os
 import logging
-import requests
-
-from pathlib import Path
-from logging import Formatter
-from logging.handlers import TimedRotatingFileHandler
-from flask import Flask
-from flask_cors import CORS
-
-from .middleware import AfterThisResponse
-from .flasklib import NamuFlask
-from .base.api.base import API as BASE_API
-from .account.api.account import API as ACCOUNT_API
-from .reservation.api.reservation import API as RESERVATION_API
+import threading
+from typing import TYPE_CHECKING
+
+from .logginglib import set_logger
 from config import CONFIG
 
+if TYPE_CHECKING:
+    from flask import Flask
+
 
 LOGGER = logging.getLogger(__name__)
 
-RESERV_CONF = CONFIG['APPS']['reservation']
-RESERV_WEBHOOK_DOMAIN = f'{RESERV_CONF["telegram.webhook.SEND_URL"]}{RESERV_CONF["telegram.bot.API_TOKEN"]}'
-RESERV_WEBHOOK_STATUS = RESERV_CONF['telegram.webhook.STATUS']
-RESERV_RECEIVE_URL = RESERV_CONF['telegram.webhook.RECEIVE_URL']
+SERVER_CONF = CONFIG.get('SERVER') or {}
 
 
-def create_app() -> Flask:
+def create_app(warm_up: bool = True) -> 'Flask':
+    """
+    :param warm_up:
+        Start pooled browsers in 'inline' execution.
+        Set False if the app is preloaded before forking, then call warm_up_browsers() in each forked process.
+    """
+    from flask_cors import CORS
+    from .middleware import AfterThisResponse
+    from .flasklib import NamuFlask
+
     app = NamuFlask(__name__)
 
     register_blueprints(app)
-    AfterThisResponse(app)  # Set callback response middleware
+    AfterThisResponse(  # Set callback response middleware
+        app,
+        max_workers=SERVER_CONF.get('after_response.workers') or 4,
+        max_queue=SERVER_CONF.get('after_response.queue_size') or 100,
+    )
 
     set_logger()
-    set_webhooks()
+    if warm_up:
+        warm_up_browsers()
 
     app.config['MAX_CONTENT_LENGTH'] = 1 << 40
     app.config['SECRET_KEY'] = os.urandom(12)
@@ -51,52 +55,23 @@ def create_app() -> Flask:
     return app
 
 
-def set_logger():
-    fmt = Formatter(
-        '[%(levelname)s %(asctime)s %(filename)s:%(lineno)s] %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S',
-    )
-
-    root_logger = logging.getLogger()
-    for handle in root_logger.handlers:
-        root_logger.removeHandler(handle)
-
-    # Add stream handler
-    stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(fmt)
-    stream_handler.setLevel(logging.INFO)
-    root_logger.addHandler(stream_handler)
-
-    # Add timed file handler
-    project_root = Path(__file__).resolve().parent.parent
-    log_dir = project_root / 'logs'
-    log_dir.mkdir(exist_ok=True)
-    file_handler = TimedRotatingFileHandler(
-        filename=log_dir / 'app.log',
-        when='midnight',
-        interval=1,
-        backupCount=100,
-        encoding='UTF-8',
-    )
-    file_handler.suffix = '%Y-%m-%d'
-    file_handler.setFormatter(fmt)
-    file_handler.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.setLevel(logging.INFO)
-
+def register_blueprints(app: 'Flask'):
+    from .base.api.base import API as BASE_API
+    from .account.api.account import API as ACCOUNT_API
+    from .reservation.api.reservation import API as RESERVATION_API
 
-def register_blueprints(app: Flask):
     app.register_blueprint(BASE_API)
     app.register_blueprint(ACCOUNT_API)
     app.register_blueprint(RESERVATION_API)
 
 
-def set_webhooks():
-    """Set or Delete webhook connection with telegram bot."""
-    if RESERV_WEBHOOK_STATUS:
-        set_reserv_webhook_url = f'{RESERV_WEBHOOK_DOMAIN}/setWebhook?' \
-                                 f'url={RESERV_RECEIVE_URL}&drop_pending_updates=true'
-        LOGGER.info(requests.get(set_reserv_webhook_url).json()["description"])
-    else:
-        delete_reserv_webhook_url = f'{RESERV_WEBHOOK_DOMAIN}/deleteWebhook?drop_pending_updates=true'
-        LOGGER.info(requests.get(delete_reserv_webhook_url).json()["description"])
+def warm_up_browsers():
+    """
+    Start pooled browsers in background so the first job does not pay for a cold start.
+    Browsers run in this process in 'inline' execution only, and in apps.worker otherwise.
+    """
+    from .reservation.api.reservation import RESERV_EXECUTION
+    if RESERV_EXECUTION != 'inline':
+        return
+    from .reservation.yeyak import get_yeyak_pool  # Import selenium only if browsers run in this process
+    threading.Thread(target=get_yeyak_pool().warm_up, name='yeyak-pool-warm-up', daemon=True).start()
@@ -4,9 +4,11 @@ MAINTAINER: Ra Daesung (daesungra@gmail.com)
 """
 
 import logging
-from flask import jsonify, render_template
+from flask import jsonify, render_template, current_app
 
 from apps.flasklib import ApiBlueprint
+from apps.logginglib import get_queue_handler
+from apps.reservation.db.redis.session_cache import get_session_cache
 
 
 LOGGER = logging.getLogger(__name__)
@@ -26,6 +28,14 @@ def home():
 def health():
     """
     Health check api.
-    Return with status_code 200.
+    Return with status_code 200 and stats of after-response callbacks, session cache and logging queue.
     """
-    return jsonify(message='ok')
+    after_this_response = getattr(current_app, 'after_this_response', None)
+    session_cache = get_session_cache()
+    queue_handler = get_queue_handler()
+    return jsonify(
+        message='ok',
+        after_response=after_this_response.stats() if after_this_response else None,
+        session_cache=session_cache.stats() if session_cache else None,
+        logging=queue_handler.stats() if queue_handler else None,
+    )
@@ -18,6 +18,11 @@ class NamuApiException(Exception):
         super().__init__(self.response, *self.args, *self.kwargs.items())
 
 
+class ServiceUnavailableError(NamuApiException):
+    code = 503
+    response = 'Service unavailable.'
+
+
 class ClientError(NamuApiException):
     code = 400
     response = 'Bad request.'
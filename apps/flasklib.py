@@ -6,12 +6,14 @@ MAINTAINER: Ra Daesung (daesungra@gmail.com)
 import logging
 import functools
 import warnings
+from time import monotonic
 from typing import Type, Union, Dict, List
 
-from flask import Flask, Blueprint, request, Response, render_template, jsonify
+from flask import Flask, Blueprint, request, Response, render_template, jsonify, g
 from flask.views import MethodView
 
 from .exception import NamuApiException, ClientError, NotFoundError
+from .metrics import REGISTRY, REQUEST_LATENCY
 
 
 def deprecated(func):
@@ -71,6 +73,10 @@ class NamuFlask(Flask):
                 sorted(self.url_map.iter_rules(), key=lambda r: r.rule)
             ])
 
+        @self.route('/metrics')
+        def get_metrics():
+            return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
         @self.errorhandler(NamuApiException)
         def namu_api_exception_handler(exc: NamuApiException):
             logger.error(f'{app_name!r} server caught an error')
@@ -110,9 +116,18 @@ class NamuFlask(Flask):
 
         @self.before_request
         def logging_before_request():
+            g.started_at = monotonic()
             logger.info(f'> {request.method} {request.path}')
 
         @self.after_request
         def logging_after_request(response: Response):
             logger.info(f'< {request.method} {request.path} {response.status_code}')
+            started_at = g.get('started_at')
+            if started_at is not None:
+                REQUEST_LATENCY.observe(
+                    monotonic() - started_at,
+                    method=request.method,
+                    route=request.url_rule.rule if request.url_rule else 'unmatched',
+                    status=response.status_code,
+                )
             return response
@@ -0,0 +1,148 @@
+"""
+Leader election among web workers for singleton duties.
+Workers compete for a redis lease, and only the holder runs duties such as webhook sync, scheduled scans and cleanup.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import os
+import logging
+import threading
+from time import monotonic
+from typing import Callable, List, Optional
+
+from apps.reservation.db.redis.lease import RedisLease
+from config import CONFIG
+
+
+LOGGER = logging.getLogger(__name__)
+SERVER_CONF = CONFIG.get('SERVER') or {}
+LEADER_TTL = SERVER_CONF.get('leader.ttl') or 15  # seconds until a crashed leader is replaced
+
+_LEADER: Optional['LeaderElector'] = None
+
+
+class Duty:
+    def __init__(self, name: str, fn: Callable[[], None], interval: float = None, retry: float = 30):
+        """
+        Singleton task run by the leader.
+
+        :param interval: seconds between runs. If None, it runs once per leadership.
+        :param retry: seconds to wait before running a failed duty again.
+        """
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.retry = retry
+        self.next_run: Optional[float] = None  # monotonic time, None once done
+
+    def reset(self):
+        self.next_run = monotonic()
+
+    def run_if_due(self):
+        now = monotonic()
+        if self.next_run is None or now < self.next_run:
+            return
+        try:
+            self.fn()
+        except Exception as e:
+            LOGGER.error(f'[LEADER] Duty {self.name} failed, retry after {self.retry} seconds. > {e}')
+            self.next_run = now + self.retry
+            return
+        self.next_run = None if self.interval is None else now + self.interval
+
+
+class LeaderElector:
+    def __init__(self, name: str = 'namu_leader', ttl: float = LEADER_TTL):
+        """
+        Campaign for a redis lease from a background thread and Run duties while holding it.
+        A worker stopping gracefully releases the lease, and a crashed one loses it after ttl seconds.
+        """
+        self.name = name
+        self.ttl = ttl
+        self.duties: List[Duty] = []
+        self.lease = RedisLease(name, ttl=ttl)
+        self._pid: Optional[int] = None
+        self._stop = threading.Event()
+
+    @property
+    def is_leader(self) -> bool:
+        return self.lease.held
+
+    def add_duty(self, name: str, fn: Callable[[], None], interval: float = None, retry: float = 30):
+        self.duties.append(Duty(name, fn, interval=interval, retry=retry))
+
+    def start(self):
+        """Start campaigning in this process. Call it in every forked worker, e.g. gunicorn post_fork."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        self._pid = pid
+        self._stop.clear()
+        self.lease = RedisLease(self.name, ttl=self.ttl)  # New token for this process
+        threading.Thread(target=self._campaign, name='leader-election', daemon=True).start()
+
+    def stop(self):
+        """Stop campaigning and Hand over leadership at once."""
+        self._stop.set()
+        if self._pid == os.getpid():
+            self.lease.release()
+
+    def _campaign(self):
+        while not self._stop.is_set():
+            try:
+                if not self.lease.held and self.lease.acquire():
+                    LOGGER.info(f'[LEADER] Process {os.getpid()} is elected.')
+                    for duty in self.duties:
+                        duty.reset()
+                if self.lease.held:
+                    for duty in self.duties:
+                        if self._stop.is_set() or not self.lease.held:
+                            break
+                        duty.run_if_due()
+            except Exception as e:
+                LOGGER.error(f'[LEADER] Election failed. > {e}')
+            self._stop.wait(1 if self.lease.held else self.ttl / 3)
+
+
+def sync_webhook():
+    """Set or Delete webhook by config. It runs on every leadership change, so pending updates are kept."""
+    from apps.manage import set_webhooks
+    if not set_webhooks(drop_pending_updates=False):
+        raise RuntimeError('Telegram answered not ok.')
+
+
+def scan_snapshot():
+    """Refresh facility list snapshot over http, so that /status answers without a browser run."""
+    from apps.reservation.facility import SOCCER_CODE
+    from apps.reservation.scanner import FacilityScanner
+    from apps.reservation.db.redis.snapshot import AvailabilitySnapshot
+    options = FacilityScanner().scan(SOCCER_CODE)
+    if not options:  # Failed scan, Keep the last snapshot
+        LOGGER.warning(f'[LEADER] Facility list is empty, snapshot is not saved.')
+        return
+    AvailabilitySnapshot().save_options(SOCCER_CODE, options)
+
+
+def recover_orphaned_jobs():
+    """Recover jobs of dead reservation workers, and Complain if jobs are waiting for no worker at all."""
+    from apps.reservation.db.redis.job_queue import JobQueue
+    queue = JobQueue()
+    queue.recover_orphans()
+    waiting = len(queue)
+    if waiting and not queue.alive_workers():
+        LOGGER.error(f'[LEADER] {waiting} jobs are waiting, but no reservation worker is alive. Run apps.worker.')
+
+
+def get_leader() -> LeaderElector:
+    """Return process-wide elector with duties enabled in SERVER config."""
+    global _LEADER
+    if _LEADER is None:
+        leader = LeaderElector()
+        if SERVER_CONF.get('leader.webhook') is not False:
+            leader.add_duty('webhook', sync_webhook)
+        scan_interval = SERVER_CONF.get('leader.scan_interval')
+        if scan_interval and (CONFIG['VAL']['seoul.yeyak'].get('http') or {}).get('url.facilities'):
+            leader.add_duty('scan', scan_snapshot, interval=scan_interval)
+        leader.add_duty('cleanup', recover_orphaned_jobs, interval=SERVER_CONF.get('leader.cleanup_interval') or 60)
+        _LEADER = leader
+    return _LEADER
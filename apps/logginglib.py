@@ -0,0 +1,248 @@
+"""
+Namu's custom logging library classes.
+Records are only queued on the request path. A background listener formats and writes them.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import os
+import json
+import atexit
+import logging
+import threading
+from datetime import datetime
+from logging import Formatter
+from logging.handlers import QueueHandler, TimedRotatingFileHandler
+from pathlib import Path
+from queue import Queue, Full, Empty
+from typing import Dict, List, Optional
+
+from apps.metrics import LOG_DROPPED
+from config import CONFIG
+
+
+LOGGING_CONF = CONFIG.get('LOGGING') or {}
+
+_STOP = object()
+_LISTENER: Optional['LogListener'] = None
+
+
+def _offload(fn, *args):
+    """
+    Run blocking fn in a native thread of gevent hub if threading is monkey patched,
+    so that slow disk does not stall every greenlet of the worker. Run it in place otherwise.
+    """
+    try:
+        from gevent import monkey, get_hub
+    except ImportError:
+        return fn(*args)
+    if not monkey.is_module_patched('threading'):
+        return fn(*args)
+    return get_hub().threadpool.apply(fn, args)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'file': f'{record.filename}:{record.lineno}',
+            'process': record.process,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: Dict[str, float]):
+        """
+        Keep a share of INFO and lower records of high-volume loggers. Warnings are always kept.
+
+        :param rates: logger name -> ratio of records kept, e.g. {'apps': 0.1}. Names match exactly.
+        """
+        super().__init__()
+        self.rates = rates
+        self._counts: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.name)
+        if rate is None or rate >= 1 or record.levelno > logging.INFO:
+            return True
+        count = self._counts.get(record.name, 0) + 1
+        self._counts[record.name] = count
+        return int(count * rate) > int((count - 1) * rate)  # Every 1/rate records evenly
+
+
+class LogListener:
+    def __init__(self, handlers: List[logging.Handler], queue_size: int = 10000, batch_size: int = 256):
+        """
+        Consumer of queued records writing them to handlers in batches.
+        It is started again in a forked process, e.g. gunicorn worker of a preloaded app.
+        """
+        self.handlers = handlers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.queue: Optional[Queue] = None
+        self._pid: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid != pid:
+                self.queue = Queue(maxsize=self.queue_size)
+                self._thread = threading.Thread(target=self._run, name='log-listener', daemon=True)
+                self._thread.start()
+                self._pid = pid
+
+    def stop(self, timeout: float = 5):
+        """Write every queued record and Stop."""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except Full:
+            return
+        self._thread.join(timeout)
+        self._pid = None
+
+    def _run(self):
+        queue = self.queue
+        while True:
+            batch = [queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(queue.get_nowait())
+                except Empty:
+                    break
+            stop = _STOP in batch
+            _offload(self._emit, [record for record in batch if record is not _STOP])
+            if stop:
+                return
+
+    def _emit(self, records: List[logging.LogRecord]):
+        # Single consumer, so that handler locks are not needed
+        for record in records:
+            for handler in self.handlers:
+                if record.levelno < handler.level or not handler.filter(record):
+                    continue
+                try:
+                    handler.emit(record)
+                except Exception:
+                    handler.handleError(record)
+        for handler in self.handlers:
+            handler.flush()
+
+
+class BoundedQueueHandler(QueueHandler):
+    def __init__(self, listener: LogListener):
+        """Queue records for listener without blocking. Records over the queue size are dropped and counted."""
+        listener.ensure_running()
+        super().__init__(listener.queue)
+        self.listener = listener
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args only. Formatting and exc_info are left for the listener.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        self.listener.ensure_running()
+        self.queue = self.listener.queue
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+            LOG_DROPPED.inc()
+
+    def stats(self) -> Dict:
+        queue = self.listener.queue
+        return {
+            'queue_depth': queue.qsize() if queue is not None else 0,
+            'queue_size': self.listener.queue_size,
+            'dropped': self.dropped,
+        }
+
+
+def start_queue_logging(handlers: List[logging.Handler],
+                        level: int = logging.INFO,
+                        queue_size: int = 10000,
+                        sampling: Dict[str, float] = None) -> BoundedQueueHandler:
+    """Replace handlers of root logger with a queue handler feeding handlers in background."""
+    global _LISTENER
+
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    if _LISTENER is not None:
+        _LISTENER.stop()
+    else:
+        atexit.register(stop_queue_logging)
+
+    _LISTENER = LogListener(handlers, queue_size=queue_size)
+    queue_handler = BoundedQueueHandler(_LISTENER)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(level)
+    return queue_handler
+
+
+def stop_queue_logging(timeout: float = 5):
+    """Write every queued record. Call it before a process exits without atexit, e.g. multiprocessing child."""
+    if _LISTENER is not None:
+        _LISTENER.stop(timeout)
+
+
+def get_queue_handler() -> Optional[BoundedQueueHandler]:
+    """Return queue handler of root logger set by start_queue_logging."""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, BoundedQueueHandler):
+            return handler
+    return None
+
+
+def set_logger():
+    """Set root logger to queue records only. A background listener formats and writes them to stream and file."""
+    if LOGGING_CONF.get('format') == 'json':
+        fmt = JsonFormatter()
+    else:
+        fmt = Formatter(
+            '[%(levelname)s %(asctime)s %(filename)s:%(lineno)s] %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S',
+        )
+    level = logging.getLevelName(LOGGING_CONF.get('level') or 'INFO')
+
+    # Stream handler
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(fmt)
+    stream_handler.setLevel(level)
+
+    # Timed file handler
+    project_root = Path(__file__).resolve().parent.parent
+    log_dir = project_root / 'logs'
+    log_dir.mkdir(exist_ok=True)
+    file_handler = TimedRotatingFileHandler(
+        filename=log_dir / 'app.log',
+        when='midnight',
+        interval=1,
+        backupCount=100,
+        encoding='UTF-8',
+    )
+    file_handler.suffix = '%Y-%m-%d'
+    file_handler.setFormatter(fmt)
+    file_handler.setLevel(level)
+
+    start_queue_logging(
+        [stream_handler, file_handler],
+        level=level,
+        queue_size=LOGGING_CONF.get('queue_size') or 10000,
+        sampling=LOGGING_CONF.get('sampling'),
+    )
@@ -0,0 +1,105 @@
+"""
+One-shot management commands, run apart from web server startup.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+
+    $ python -m apps.manage webhook          # set or delete by 'telegram.webhook.STATUS'
+    $ python -m apps.manage set-webhook
+    $ python -m apps.manage delete-webhook
+    $ python -m apps.manage set-webhook --drop-pending-updates
+"""
+
+import sys
+import argparse
+import logging
+from typing import Dict
+
+import requests
+
+from apps.logginglib import set_logger, stop_queue_logging
+from config import CONFIG
+
+
+LOGGER = logging.getLogger(__name__)
+
+RESERV_CONF = CONFIG['APPS']['reservation']
+RESERV_WEBHOOK_DOMAIN = f'{RESERV_CONF["telegram.webhook.SEND_URL"]}{RESERV_CONF["telegram.bot.API_TOKEN"]}'
+RESERV_WEBHOOK_STATUS = RESERV_CONF['telegram.webhook.STATUS']
+RESERV_RECEIVE_URL = RESERV_CONF['telegram.webhook.RECEIVE_URL']
+TIMEOUT = 10  # seconds of telegram api call
+
+
+def get_webhook_info() -> Dict:
+    """Return webhook info of reservation bot. Its 'url' is empty if no webhook is set."""
+    response = requests.get(f'{RESERV_WEBHOOK_DOMAIN}/getWebhookInfo', timeout=TIMEOUT).json()
+    if not response.get('ok'):
+        raise ValueError(f'getWebhookInfo answered not ok, {response.get("description")}')
+    return response['result']
+
+
+def set_webhook(drop_pending_updates: bool = False) -> bool:
+    """
+    Set webhook of reservation bot to 'telegram.webhook.RECEIVE_URL' unless it is set already.
+    Pending updates are delivered to the new webhook unless drop_pending_updates.
+    """
+    if not drop_pending_updates and get_webhook_info().get('url') == RESERV_RECEIVE_URL:
+        LOGGER.info('Webhook is already set.')
+        return True
+    params = {'url': RESERV_RECEIVE_URL}
+    if drop_pending_updates:
+        params['drop_pending_updates'] = 'true'
+    response = requests.get(f'{RESERV_WEBHOOK_DOMAIN}/setWebhook', params=params, timeout=TIMEOUT).json()
+    LOGGER.info(response.get('description'))
+    return bool(response.get('ok'))
+
+
+def delete_webhook(drop_pending_updates: bool = False) -> bool:
+    """
+    Delete webhook of reservation bot if one is set.
+    Pending updates are kept for getUpdates, e.g. apps.poller, unless drop_pending_updates.
+    """
+    if not get_webhook_info().get('url'):
+        LOGGER.info('Webhook is not set.')
+        return True
+    response = requests.get(
+        f'{RESERV_WEBHOOK_DOMAIN}/deleteWebhook',
+        params={'drop_pending_updates': 'true'} if drop_pending_updates else {},
+        timeout=TIMEOUT,
+    ).json()
+    LOGGER.info(response.get('description'))
+    return bool(response.get('ok'))
+
+
+def set_webhooks(drop_pending_updates: bool = False) -> bool:
+    """Set or Delete webhook connection with telegram bot by 'telegram.webhook.STATUS'."""
+    if RESERV_WEBHOOK_STATUS:
+        return set_webhook(drop_pending_updates)
+    return delete_webhook(drop_pending_updates)
+
+
+COMMANDS = {
+    'webhook': set_webhooks,
+    'set-webhook': set_webhook,
+    'delete-webhook': delete_webhook,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a management command of namu-bot.')
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--drop-pending-updates', action='store_true',
+                        help='drop updates telegram has not delivered yet')
+    args = parser.parse_args()
+
+    set_logger()
+    try:
+        ok = COMMANDS[args.command](drop_pending_updates=args.drop_pending_updates)
+    except (requests.RequestException, ValueError) as e:
+        LOGGER.error(f'{args.command} failed. > {e}')
+        ok = False
+    finally:
+        stop_queue_logging()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
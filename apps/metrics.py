@@ -0,0 +1,379 @@
+"""
+Namu's process metrics exposed in prometheus text format.
+Each process keeps its own samples and flushes them to a redis hash,
+so that /metrics answered by any gunicorn worker shows every web and reservation worker process.
+Counters and histograms of a dead process are folded into accumulated totals, so that they never go down.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import os
+import json
+import bisect
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from time import sleep, time, monotonic
+from typing import Callable, Dict, List, Tuple, Optional
+
+from config import CONFIG
+
+
+LOGGER = logging.getLogger(__name__)
+METRICS_CONF = CONFIG.get('METRICS') or {}
+FLUSH_INTERVAL = METRICS_CONF.get('flush_interval') or 10  # seconds between flushes of a process to redis
+STALE_AFTER = METRICS_CONF.get('stale_after') or 60  # seconds after which samples of a silent process are dropped
+REDIS_KEY = 'namu_metrics'
+ACCUMULATED_KEY = 'namu_metrics_accumulated'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelValues = Tuple[str, ...]
+
+# KEYS[1]: metrics hash, ARGV[1]: process id, ARGV[2]: samples json, ARGV[3]: '1' if flushed before
+FLUSH_SCRIPT = """
+if ARGV[3] == '1' and redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+return 1
+"""
+# KEYS[1]: metrics hash, KEYS[2]: accumulated hash, ARGV[1]: process id, ARGV[2]: samples json read,
+# ARGV[3..]: pairs of accumulated field and increment
+FOLD_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+for i = 3, #ARGV, 2 do
+    redis.call('HINCRBYFLOAT', KEYS[2], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+
+class Metric:
+    kind: Optional[str] = None
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = labels
+        self._values: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict) -> LabelValues:
+        REGISTRY.ensure_flushing()
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def samples(self) -> List[Tuple[LabelValues, object]]:
+        with self._lock:
+            return list(self._values.items())
+
+    def subtract(self, key: LabelValues, value):
+        """Take value folded into accumulated totals off the sample of key. Gauges are not folded."""
+        pass
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def subtract(self, key: LabelValues, value):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) - value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, description, labels)
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels):
+        """Read value from fn whenever samples are collected."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def samples(self) -> List[Tuple[LabelValues, object]]:
+        with self._lock:
+            values, functions = dict(self._values), list(self._functions.items())
+        for key, fn in functions:
+            try:
+                values[key] = fn()
+            except Exception as e:
+                LOGGER.warning(f'[METRICS] {self.name} not collected. > {e}')
+        return list(values.items())
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._values.get(key)
+            if sample is None:
+                sample = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]  # counts, sum, count
+            sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe seconds taken by the with block."""
+        started = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(monotonic() - started, **labels)
+
+    def samples(self) -> List[Tuple[LabelValues, object]]:
+        with self._lock:
+            return [(key, [list(counts), total, count]) for key, (counts, total, count) in self._values.items()]
+
+    def subtract(self, key: LabelValues, value):
+        counts, total, count = value
+        with self._lock:
+            sample = self._values.get(key)
+            if sample is None:
+                return
+            sample[0] = [a - b for a, b in zip(sample[0], counts)]
+            sample[1] -= total
+            sample[2] -= count
+
+
+class Registry:
+    def __init__(self):
+        """Metrics of this process, shared with other processes through redis."""
+        self.metrics: Dict[str, Metric] = {}
+        self._flusher_pid: Optional[int] = None
+        self._flushed: Optional[Dict] = None  # samples of the last flush of this process
+        self._lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+
+    @property
+    def process_id(self) -> str:
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def register(self, metric: Metric):
+        assert metric.name not in self.metrics, f'Metric {metric.name} is already registered.'
+        self.metrics[metric.name] = metric
+
+    def collect(self) -> Dict:
+        """Return samples of this process as {name: [[label_values, value], ...]}."""
+        return {name: [[list(key), value] for key, value in metric.samples()]
+                for name, metric in self.metrics.items()}
+
+    def ensure_flushing(self):
+        """Start flushing thread of this process. It is started again in a forked process."""
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._lock:
+            if self._flusher_pid != pid:
+                self._flusher_pid = pid
+                self._flushed = None  # Flushed by the parent process under its own id
+                threading.Thread(target=self._flush_forever, name='metrics-flusher', daemon=True).start()
+
+    def flush(self):
+        """
+        Write samples of this process to redis.
+        If this process was taken as dead and folded meanwhile, e.g. stalled over STALE_AFTER,
+        the folded samples are taken off so that they are not counted twice.
+        """
+        from apps.reservation.db.redis import REDIS
+        with self._flush_lock:
+            samples = self.collect()
+            flushed = REDIS.register_script(FLUSH_SCRIPT)(keys=[REDIS_KEY], args=[
+                self.process_id,
+                json.dumps({'updated': time(), 'samples': samples}, separators=(',', ':')),
+                int(self._flushed is not None),
+            ])
+            if flushed:
+                self._flushed = samples
+                return
+
+            LOGGER.warning(f'[METRICS] Samples of {self.process_id} were folded as a dead process, flush the rest.')
+            for name, values in self._flushed.items():
+                metric = self.metrics.get(name)
+                if metric is not None:
+                    for key, value in values:
+                        metric.subtract(tuple(key), value)
+            self._flushed = None
+            self.flush()
+
+    def render(self) -> str:
+        """Return samples of every live process merged in prometheus text format."""
+        try:
+            processes = self._load_processes()
+        except Exception as e:
+            LOGGER.error(f'[METRICS] Shared metrics not loaded, render this process only. > {e}')
+            processes = [self.collect()]
+
+        merged: Dict[str, Dict[LabelValues, object]] = {name: {} for name in self.metrics}
+        for samples in processes:
+            for name, values in samples.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for key, value in values:
+                    key = tuple(key)
+                    merged[name][key] = _merge_value(metric, merged[name].get(key), value)
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.description}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for key, value in sorted(merged[name].items()):
+                lines.extend(_format_sample(metric, key, value))
+        return '\n'.join(lines) + '\n'
+
+    def _load_processes(self) -> List[Dict]:
+        from apps.reservation.db.redis import REDIS
+        self.flush()
+        processes, now = [], time()
+        for process_id, raw in REDIS.hgetall(REDIS_KEY).items():
+            data = json.loads(raw)
+            if now - data['updated'] > STALE_AFTER:
+                self._fold(process_id, raw, data['samples'])
+                continue
+            processes.append(data['samples'])
+        processes.append(self._load_accumulated(REDIS.hgetall(ACCUMULATED_KEY)))
+        return processes
+
+    def _fold(self, process_id: str, raw: str, samples: Dict):
+        """
+        Add counters and histograms of a dead process to accumulated totals and Drop its samples at once.
+        Nothing is done if another process folded it first or it flushed again.
+        """
+        from apps.reservation.db.redis import REDIS
+        increments = []
+        for name, values in samples.items():
+            metric = self.metrics.get(name)
+            if not isinstance(metric, (Counter, Histogram)):
+                continue
+            for key, value in values:
+                if isinstance(metric, Histogram):
+                    counts, total, count = value
+                    parts = [*enumerate(counts), ('sum', total), ('count', count)]
+                else:
+                    parts = [(None, value)]
+                increments.extend(item for part, amount in parts if amount
+                                  for item in (json.dumps([name, key, part], ensure_ascii=False), amount))
+        REDIS.register_script(FOLD_SCRIPT)(keys=[REDIS_KEY, ACCUMULATED_KEY], args=[process_id, raw, *increments])
+
+    def _load_accumulated(self, raw: Dict[str, str]) -> Dict:
+        """Return accumulated totals in the same form as samples of a process."""
+        accumulated: Dict[str, Dict[LabelValues, object]] = {}
+        for field, value in raw.items():
+            name, key, part = json.loads(field)
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            values, key, value = accumulated.setdefault(name, {}), tuple(key), _number(float(value))
+            if not isinstance(metric, Histogram):
+                values[key] = value
+                continue
+            sample = values.setdefault(key, [[0] * (len(metric.buckets) + 1), 0.0, 0])
+            if part == 'sum':
+                sample[1] = value
+            elif part == 'count':
+                sample[2] = value
+            elif part < len(sample[0]):  # Buckets of a previous version may differ
+                sample[0][part] = value
+        return {name: [[list(key), value] for key, value in values.items()] for name, values in accumulated.items()}
+
+    def _flush_forever(self):
+        while True:
+            sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                LOGGER.warning(f'[METRICS] Flush failed. > {e}')
+
+
+def _number(value: float):
+    return int(value) if value.is_integer() else value
+
+
+def _merge_value(metric: Metric, merged, value):
+    if merged is None:
+        return value
+    if isinstance(metric, Histogram):
+        return [[a + b for a, b in zip(merged[0], value[0])], merged[1] + value[1], merged[2] + value[2]]
+    return merged + value  # Gauges are summed up as totals of processes
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    escaped = [v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values]
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+def _format_sample(metric: Metric, key: LabelValues, value) -> List[str]:
+    if not isinstance(metric, Histogram):
+        return [f'{metric.name}{_format_labels(metric.label_names, key)} {value}']
+
+    counts, total, count = value
+    names, lines, cumulative = metric.label_names + ('le',), [], 0
+    for bound, bucket_count in zip(metric.buckets + (float('inf'),), counts):
+        cumulative += bucket_count
+        le = '+Inf' if bound == float('inf') else repr(float(bound))
+        lines.append(f'{metric.name}_bucket{_format_labels(names, key + (le,))} {cumulative}')
+    labels = _format_labels(metric.label_names, key)
+    lines.append(f'{metric.name}_sum{labels} {total}')
+    lines.append(f'{metric.name}_count{labels} {count}')
+    return lines
+
+
+REGISTRY = Registry()
+
+# Web server
+REQUEST_LATENCY = Histogram('namu_request_seconds', 'Latency of http requests by route.',
+                            labels=('method', 'route', 'status'))
+WEBHOOK_UPDATES = Counter('namu_webhook_updates_total', 'Telegram updates received by type.', labels=('type',))
+CALLBACK_QUEUE_DEPTH = Gauge('namu_after_response_queue_depth', 'After-response callbacks waiting to run.')
+CALLBACK_RUN_TIME = Histogram('namu_after_response_run_seconds', 'Run time of after-response callbacks of a request.')
+CALLBACK_REJECTED = Counter('namu_after_response_rejected_total', 'After-response callbacks rejected by full queue.')
+LOG_DROPPED = Counter('namu_log_dropped_total', 'Log records dropped by full logging queue.')
+
+# Browsers and scans
+BROWSERS = Gauge('namu_browsers', 'Pooled browsers by state.', labels=('state',))
+SCAN_ITERATIONS = Counter('namu_scan_iterations_total', 'Scan iterations of facility list.', labels=('mode',))
+SCAN_TIME_TO_MATCH = Histogram('namu_scan_time_to_match_seconds', 'Seconds from scan start to a matched facility.',
+                               labels=('mode',))
+
+# Backends
+REDIS_LATENCY = Histogram('namu_redis_command_seconds', 'Latency of redis commands.', labels=('command',),
+                          buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1, 5))
+TELEGRAM_SEND_LATENCY = Histogram('namu_telegram_request_seconds', 'Latency of telegram bot api calls.',
+                                  labels=('method',))
+TELEGRAM_SEND_ERRORS = Counter('namu_telegram_request_errors_total', 'Failed telegram bot api calls.',
+                               labels=('method', 'reason'))
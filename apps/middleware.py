@@ -1,19 +1,151 @@
+import logging
+import threading
 import traceback
+from queue import Queue
+from time import monotonic
+from typing import Callable, Dict, List
 from werkzeug.wsgi import ClosingIterator
 
-from flask import Flask
+from flask import Flask, request
+
+from apps.metrics import CALLBACK_QUEUE_DEPTH, CALLBACK_RUN_TIME, CALLBACK_REJECTED
+
+
+LOGGER = logging.getLogger(__name__)
+ENVIRON_KEY = 'namu.after_this_response'
+RESERVED_KEY = 'namu.after_this_response.reserved'
+
+
+class CallbackExecutor:
+    def __init__(self, max_workers: int = 4, max_queue: int = 100):
+        """
+        Bounded executor for after-response callbacks.
+        Under gevent monkey patching, worker threads are greenlets.
+
+        :param max_workers: callbacks running at the same time.
+        :param max_queue: callbacks waiting to run. Callbacks over this are rejected.
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._queue = Queue(maxsize=max_queue)
+        self._room = threading.BoundedSemaphore(max_queue)  # Taken from reserve() until a worker gets the callbacks
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.run_time_total = 0.0
+        self.run_time_max = 0.0
+        CALLBACK_QUEUE_DEPTH.set_function(self._queue.qsize)
+
+    def reserve(self) -> bool:
+        """Reserve room in the queue for callbacks of a request. Return False if the queue is full."""
+        if self._room.acquire(blocking=False):
+            return True
+        self.rejected += 1
+        CALLBACK_REJECTED.inc()
+        LOGGER.error(f'After-response queue is full. Request rejected.')
+        return False
+
+    def cancel(self):
+        """Give back room reserved by a request which registered no callbacks."""
+        self._room.release()
+
+    def submit(self, callbacks: List[Callable], reserved: bool = False) -> bool:
+        """
+        Queue callbacks of a request to run in order. Return False if the queue is full.
+
+        :param reserved: room is already reserved by reserve().
+        """
+        if not reserved and not self.reserve():
+            return False
+        self._start_workers()
+        self._queue.put_nowait((monotonic(), callbacks))
+        self.submitted += 1
+        return True
+
+    def stats(self) -> Dict:
+        done = self.completed or 1
+        return {
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'queue_depth': self._queue.qsize(),
+            'running': self.running,
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'failed': self.failed,
+            'wait_time_avg': self.wait_time_total / done,
+            'wait_time_max': self.wait_time_max,
+            'run_time_avg': self.run_time_total / done,
+            'run_time_max': self.run_time_max,
+        }
+
+    def _start_workers(self):
+        if len(self._workers) >= self.max_workers:
+            return
+        with self._lock:
+            while len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._work, name=f'after-response-{len(self._workers)}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            queued_at, callbacks = self._queue.get()
+            self._room.release()
+            started_at = monotonic()
+            wait_time = started_at - queued_at
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+            self.running += 1
+            try:
+                for fn in callbacks:
+                    try:
+                        fn()
+                    except Exception:
+                        self.failed += 1
+                        traceback.print_exc()
+            finally:
+                self.running -= 1
+                run_time = monotonic() - started_at
+                self.run_time_total += run_time
+                self.run_time_max = max(self.run_time_max, run_time)
+                CALLBACK_RUN_TIME.observe(run_time)
+                self.completed += 1
+                self._queue.task_done()
 
 
 class AfterThisResponse:
-    def __init__(self, app: Flask = None):
-        self.callbacks = []
+    def __init__(self, app: Flask = None, max_workers: int = 4, max_queue: int = 100):
+        self.executor = CallbackExecutor(max_workers=max_workers, max_queue=max_queue)
         if app:
             self.init_app(app)
 
     def __call__(self, callback):
-        self.callbacks.append(callback)
+        """Register callback to run after the response of current request."""
+        request.environ.setdefault(ENVIRON_KEY, []).append(callback)
         return callback
 
+    def reserve(self) -> bool:
+        """
+        Reserve room for callbacks of current request before answering it.
+        Return False if the queue is full, so that the request is refused instead of dropped after response.
+        """
+        if request.environ.get(RESERVED_KEY):
+            return True
+        if not self.executor.reserve():
+            return False
+        request.environ[RESERVED_KEY] = True
+        return True
+
     def init_app(self, app: Flask):
         # Install extension
         app.after_this_response = self
@@ -21,15 +153,17 @@ class AfterThisResponse:
         # Install middleware
         app.wsgi_app = AfterThisResponseMiddleware(app.wsgi_app, self)
 
-    def flush(self):
-        try:
-            for fn in self.callbacks:
-                try:
-                    fn()
-                except Exception:
-                    traceback.print_exc()
-        finally:
-            self.callbacks = []
+    def flush(self, environ: Dict):
+        """Hand callbacks registered by the request of environ to the executor."""
+        callbacks = environ.pop(ENVIRON_KEY, None)
+        reserved = environ.pop(RESERVED_KEY, False)
+        if callbacks:
+            self.executor.submit(callbacks, reserved=reserved)
+        elif reserved:
+            self.executor.cancel()
+
+    def stats(self) -> Dict:
+        return self.executor.stats()
 
 
 class AfterThisResponseMiddleware:
@@ -40,7 +174,7 @@ class AfterThisResponseMiddleware:
     def __call__(self, environ, start_response):
         iterator = self.application(environ, start_response)
         try:
-            return ClosingIterator(iterator, [self.after_this_response_ext.flush])
+            return ClosingIterator(iterator, [lambda: self.after_this_response_ext.flush(environ)])
         except Exception:
             traceback.print_exc()
             return iterator
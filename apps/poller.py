@@ -0,0 +1,204 @@
+"""
+Telegram update poller entrypoint.
+It long-polls getUpdates in batches instead of receiving webhook, for deployments without public https endpoint.
+Updates of a chat are handled in order with 'inline' execution only.
+With 'queue' execution they are spread over apps.worker processes, and may run out of order.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+
+    $ python -m apps.poller
+"""
+
+import argparse
+import logging
+import signal
+import threading
+from queue import Queue
+from time import sleep
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+from apps.logginglib import set_logger, stop_queue_logging
+from apps.manage import delete_webhook
+from apps.metrics import WEBHOOK_UPDATES
+from apps.reservation.api.reservation import RESERV_EXECUTION
+from apps.reservation.reservationbot import ReservationBot
+from apps.reservation.db.redis import REDIS
+from apps.reservation.db.redis.job_queue import JobQueue
+from apps.reservation.db.redis.lease import RedisLease
+from apps.reservation.db.redis.update_registry import UpdateRegistry
+from apps.telegramlib import flush_senders
+from config import CONFIG
+
+
+LOGGER = logging.getLogger(__name__)
+
+RESERV_CONF = CONFIG['APPS']['reservation']
+RESERV_WEBHOOK_DOMAIN = f'{RESERV_CONF["telegram.webhook.SEND_URL"]}{RESERV_CONF["telegram.bot.API_TOKEN"]}'
+RESERV_WEBHOOK_STATUS = RESERV_CONF['telegram.webhook.STATUS']
+POLL_TIMEOUT = RESERV_CONF.get('telegram.polling.timeout') or 30  # seconds telegram holds a getUpdates call
+POLL_LIMIT = RESERV_CONF.get('telegram.polling.limit') or 100  # updates per batch, telegram allows up to 100
+POLL_LANES = RESERV_CONF.get('telegram.polling.lanes') or 8  # updates handled at once in 'inline' execution
+OFFSET_KEY = 'telegram_updates_offset'
+
+
+def chat_id_of(update: Dict) -> Optional[str]:
+    """Return chat id of any update type, e.g. message, my_chat_member or callback_query."""
+    for key, value in update.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if chat:
+            return str(chat.get('id'))
+    return None
+
+
+class ChatLanes:
+    def __init__(self, lanes: int = POLL_LANES, lane_size: int = POLL_LIMIT):
+        """
+        Run handlers concurrently in lanes. A chat always uses the same lane, so that its updates keep their order.
+        Submitting blocks while the lane is full.
+        """
+        self._lanes: List[Queue] = [Queue(maxsize=lane_size) for _ in range(lanes)]
+        for i, lane in enumerate(self._lanes):
+            threading.Thread(target=self._work, args=(lane,), name=f'update-lane-{i}', daemon=True).start()
+
+    def submit(self, key: str, fn: Callable[[], None]):
+        self._lanes[hash(key) % len(self._lanes)].put(fn)
+
+    def join(self):
+        for lane in self._lanes:
+            lane.join()
+
+    @staticmethod
+    def _work(lane: Queue):
+        while True:
+            fn = lane.get()
+            try:
+                fn()
+            except Exception:
+                LOGGER.exception(f'[POLLER] Update handling failed.')
+            finally:
+                lane.task_done()
+
+
+class UpdatePoller:
+    def __init__(self, execution: str = RESERV_EXECUTION):
+        """
+        Consume telegram updates by getUpdates until stop() is called.
+        Only the holder of the poller lease polls, since telegram allows one consumer per bot.
+        Offset is kept in redis, so that a restarted or standby poller continues after the last batch.
+
+        :param execution: 'queue' enqueues updates for apps.worker, 'inline' handles them in ChatLanes.
+        """
+        self.execution = execution
+        self.registry = UpdateRegistry()
+        self.queue = JobQueue()
+        self.lanes = ChatLanes() if execution == 'inline' else None
+        self.lease = RedisLease('telegram_poller', ttl=max(POLL_TIMEOUT * 2, 30))
+        self.session = requests.Session()
+        self._running = False
+
+    def run(self):
+        self._running = True
+        try:
+            while self._running:
+                if not self.lease.held and not self.lease.acquire():
+                    sleep(5)  # Standby until the active poller is gone
+                    continue
+                try:
+                    self._poll_once()
+                except Exception:
+                    LOGGER.exception(f'[POLLER] Batch failed, poll again from the last offset.')
+                    sleep(5)
+        finally:
+            if self.lanes is not None:
+                self.lanes.join()
+            flush_senders(timeout=30)
+            self.lease.release()
+            LOGGER.info(f'[POLLER] stopped.')
+
+    def stop(self, *args):
+        """Finish the current batch and Stop."""
+        self._running = False
+
+    def _poll_once(self):
+        offset = int(REDIS.get(OFFSET_KEY) or 0)
+        try:
+            response = self.session.post(
+                f'{RESERV_WEBHOOK_DOMAIN}/getUpdates',
+                json={'offset': offset, 'limit': POLL_LIMIT, 'timeout': POLL_TIMEOUT},
+                timeout=POLL_TIMEOUT + 10,
+            )
+            result_json = response.json()
+        except (requests.RequestException, ValueError) as e:
+            LOGGER.warning(f'[POLLER] getUpdates failed, retry. > {e}')
+            sleep(5)
+            return
+        if not result_json.get('ok'):
+            # e.g. 409 while a webhook is set or another consumer polls
+            LOGGER.error(f'[POLLER] getUpdates answered {response.status_code}. > {result_json.get("description")}')
+            sleep((result_json.get('parameters') or {}).get('retry_after') or 5)
+            return
+
+        updates = result_json.get('result') or []
+        if not updates:
+            return
+        self._dispatch(updates)
+        if self.lease.held:  # Do not move offset of the new holder
+            REDIS.set(OFFSET_KEY, updates[-1]['update_id'] + 1)
+        LOGGER.info(f'[POLLER] {len(updates)} updates dispatched.')
+
+    def _dispatch(self, updates: List[Dict]):
+        # Drop updates already processed, e.g. by webhook before switching or by a previous holder
+        registered = self.registry.register_many([update['update_id'] for update in updates])
+        updates = [update for update, is_new in zip(updates, registered) if is_new]
+        for update in updates:
+            WEBHOOK_UPDATES.inc(type=next((key for key in update if key != 'update_id'), 'unknown'))
+        if not updates:
+            return
+
+        if self.execution == 'queue':
+            try:
+                self.queue.enqueue_many(updates)
+            except Exception:
+                for update in updates:  # Let them be polled again
+                    self.registry.unregister(update['update_id'])
+                raise
+            return
+
+        for update in updates:
+            self.lanes.submit(chat_id_of(update) or str(update['update_id']), self._handler(update))
+
+    @staticmethod
+    def _handler(update: Dict) -> Callable[[], None]:
+        def _handle():
+            ReservationBot(telegram_info=update).action_by_step()
+        return _handle
+
+
+def main():
+    argparse.ArgumentParser(description='Poll telegram updates instead of webhook.').parse_args()
+
+    set_logger()
+    if RESERV_WEBHOOK_STATUS:
+        LOGGER.critical(f'[POLLER] telegram.webhook.STATUS is set. getUpdates does not work while webhook is set.')
+        stop_queue_logging()
+        raise SystemExit(1)
+
+    try:
+        delete_webhook()  # A webhook left by a previous deployment blocks getUpdates. Its pending updates are kept.
+    except (requests.RequestException, ValueError) as e:
+        LOGGER.warning(f'[POLLER] Failed to delete webhook. > {e}')
+
+    poller = UpdatePoller()
+    signal.signal(signal.SIGTERM, poller.stop)
+    signal.signal(signal.SIGINT, poller.stop)
+    try:
+        poller.run()
+    finally:
+        stop_queue_logging()
+
+
+if __name__ == '__main__':
+    main()
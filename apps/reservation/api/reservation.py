@@ -7,8 +7,11 @@ import logging
 from flask import request, jsonify, current_app
 
 from apps.flasklib import ApiBlueprint, ApiView
-from apps.exception import DetailedNotFoundError
+from apps.exception import DetailedNotFoundError, ServiceUnavailableError
+from apps.metrics import WEBHOOK_UPDATES
 from apps.reservation.reservationbot import ReservationBot
+from apps.reservation.db.redis.job_queue import JobQueue
+from apps.reservation.db.redis.update_registry import UpdateRegistry
 from config import CONFIG
 
 
@@ -17,6 +20,7 @@ API = ApiBlueprint(__name__, url_prefix='/reservation')
 
 RESERV_CONF = CONFIG['APPS']['reservation']
 RESERV_WEBHOOK_DOMAIN = f'{RESERV_CONF["telegram.webhook.SEND_URL"]}{RESERV_CONF["telegram.bot.API_TOKEN"]}'
+RESERV_EXECUTION = RESERV_CONF.get('execution') or 'inline'  # 'inline': run after response, 'queue': run by apps.worker
 
 
 class ReservationApiNotFoundError(DetailedNotFoundError):
@@ -32,7 +36,30 @@ class Reservation(ApiView):
     def post(self):
         """Receive webhook message from reservation bot."""
         # TODO: Add session flow by chat_id and username(using Redis).
-        telegram_info = request.get_json()
+        telegram_info = request.get_json(silent=True)
+        if not isinstance(telegram_info, dict):
+            LOGGER.warning(f'[WEBHOOK] Update is not a json object. > {request.get_data(as_text=True)[:200]}')
+            WEBHOOK_UPDATES.inc(type='invalid')
+            return jsonify(data={})
+        WEBHOOK_UPDATES.inc(type=next((key for key in telegram_info if key != 'update_id'), 'unknown'))
+
+        # Drop update redelivered by telegram before any bot or browser work
+        update_id, registry = telegram_info.get('update_id'), UpdateRegistry()
+        if update_id is not None and not registry.register(update_id):
+            LOGGER.info(f'[DUPLICATE] update_id {update_id} is already processed.')
+            return jsonify(data={})
+
+        if RESERV_EXECUTION == 'queue':
+            try:
+                JobQueue().enqueue(telegram_info)
+            except Exception:
+                registry.unregister(update_id)  # Let telegram retry it
+                raise
+            return jsonify(data={})
+
+        if not current_app.after_this_response.reserve():
+            registry.unregister(update_id)  # Let telegram retry it
+            raise ServiceUnavailableError('Bot is busy, retry later.')
 
         @current_app.after_this_response
         def post_process():
@@ -5,13 +5,25 @@ MAINTAINER: Ra Daesung (daesungra@gmail.com)
 
 import logging
 import redis
+from time import monotonic
 
+from apps.metrics import REDIS_LATENCY
 from config import CONFIG
 
 LOGGER = logging.getLogger(__name__)
 REDIS_CONF = CONFIG['DB']['redis']
 
 
+class InstrumentedRedis(redis.StrictRedis):
+    def execute_command(self, *args, **options):
+        """Execute a command and Observe its latency by command name."""
+        started_at = monotonic()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            REDIS_LATENCY.observe(monotonic() - started_at, command=str(args[0]).upper())
+
+
 def _create_redis_object():
     try:
         host = REDIS_CONF['host']
@@ -20,7 +32,7 @@ def _create_redis_object():
         LOGGER.critical(f'Redis config missing, {ke}')
         raise
 
-    conn = redis.StrictRedis(
+    conn = InstrumentedRedis(
         host=host,
         port=port,
         charset='utf-8',
@@ -10,6 +10,7 @@ from typing import Dict, Optional
 from redis.exceptions import ConnectionError, TimeoutError
 
 from apps.reservation.db.redis import REDIS
+from apps.reservation.db.redis.session_cache import get_session_cache
 from config import CONFIG
 
 
@@ -17,6 +18,21 @@ LOGGER = logging.getLogger(__name__)
 REDIS_CONF = CONFIG['DB']['redis']
 TTL = timedelta(seconds=REDIS_CONF['ttl'])
 
+# Load session, Create it if missing and Reset TTL in a single round trip.
+# KEYS[1]: session name, ARGV: ttl seconds, chat_id, username
+# Return: {created(0/1), flat list of hash fields}
+LOAD_OR_CREATE_SCRIPT = REDIS.register_script("""
+local fields = redis.call('HGETALL', KEYS[1])
+local created = 0
+if #fields == 0 then
+    redis.call('HMSET', KEYS[1], 'chat_id', ARGV[2], 'username', ARGV[3])
+    fields = {'chat_id', ARGV[2], 'username', ARGV[3]}
+    created = 1
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return {created, fields}
+""")
+
 
 class ChatSession:
     name: Optional[str] = None
@@ -24,39 +40,83 @@ class ChatSession:
     username: Optional[str] = None
     kwargs: Optional[Dict] = None
 
-    def __init__(self, chat_id: str):
-        """Set and Get redis session info."""
+    def __init__(self, chat_id: str, load: bool = True):
+        """
+        Set and Get redis session info.
+
+        :param load: read session hash from redis. If False, nothing is read and exists() is False.
+        """
         if chat_id is None:
             raise ValueError(f'[REDIS] No chat_id inserted.')
 
         self.name = f'chat_session_{chat_id}'
         self.chat_id = chat_id
+        self._exists = False
+
+        if load:
+            self._set_info(REDIS.hgetall(self.name))
 
-        session_info = REDIS.hgetall(self.name)
+    @classmethod
+    def load_or_create(cls, chat_id: str, username: str) -> 'ChatSession':
+        """
+        Load session of chat_id or Create it with username, and Reset TTL in a single round trip.
+        If session cache is enabled, a cached session is used without any round trip.
+        """
+        session = cls(chat_id, load=False)
+        cache = get_session_cache()
+        if cache is not None:
+            session_info = cache.get(session.name)
+            if session_info is not None:
+                session._set_info(session_info)
+                return session
+
+        created, fields = LOAD_OR_CREATE_SCRIPT(
+            keys=[session.name],
+            args=[int(TTL.total_seconds()), chat_id, username],
+        )
+        session_info = dict(zip(fields[::2], fields[1::2]))
+        if cache is not None:
+            cache.set(session.name, session_info)
+        session._set_info(session_info)
+        if created:
+            LOGGER.info(f"[REDIS] {session.name} Created.")
+        return session
+
+    def _set_info(self, session_info: Dict):
+        self._exists = bool(session_info)
         if 'username' in session_info:
             self.username = session_info.pop('username')
             self.kwargs = {**session_info}
 
-    def exists(self):
-        return bool(REDIS.exists(self.name))
+    def exists(self, refresh: bool = False) -> bool:
+        """
+        Whether session exists. The state known by the last load, commit or delete is returned
+        without a round trip, unless refresh is set.
+        """
+        if refresh:
+            self._exists = bool(REDIS.exists(self.name))
+        return self._exists
 
     def commit(self, **kwargs):
-        """Update current data to redis server"""
+        """Update current data and Reset TTL to redis server in a single round trip"""
         assert self.username is not None
 
+        mapping = {
+            'chat_id': self.chat_id,
+            'username': self.username,
+            **kwargs,
+        }
         try:
-            REDIS.hmset(
-                name=self.name,
-                mapping={
-                    'chat_id': self.chat_id,
-                    'username': self.username,
-                    **kwargs,
-                },
-            )
+            pipeline = REDIS.pipeline(transaction=True)
+            pipeline.hmset(name=self.name, mapping=mapping)
+            pipeline.expire(self.name, TTL)
+            pipeline.execute()
         except (ConnectionError, TimeoutError) as e:
             LOGGER.critical(f'Redis error occurred. > {e}')
         else:
-            self.touch()
+            self._exists = True
+            self.kwargs = {**(self.kwargs or {}), **kwargs}
+            self._invalidate_cache()
             LOGGER.info(f"[REDIS] {self.name} Updated.")
 
     def touch(self):
@@ -66,4 +126,12 @@ class ChatSession:
     def delete(self):
         """Delete session"""
         REDIS.delete(self.name)
+        self._exists = False
+        self._invalidate_cache()
         LOGGER.info(f"[REDIS] {self.name} Deleted..")
+
+    def _invalidate_cache(self):
+        """Drop this session from caches of every worker."""
+        cache = get_session_cache()
+        if cache is not None:
+            cache.invalidate(self.name)
@@ -0,0 +1,126 @@
+"""
+Redis job queue for reservation bot commands.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import json
+import logging
+import socket
+import os
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from apps.reservation.db.redis import REDIS
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Job:
+    id: Optional[str] = None
+    payload: Optional[Dict] = None
+    enqueued_at: Optional[float] = None
+    raw: Optional[str] = None
+
+    def __init__(self, raw: str):
+        """Decode a job envelope popped from redis."""
+        self.raw = raw
+        envelope = json.loads(raw)
+        self.id = envelope['id']
+        self.payload = envelope['payload']
+        self.enqueued_at = envelope['enqueued_at']
+
+    @staticmethod
+    def encode(payload: Dict) -> str:
+        return json.dumps({
+            'id': uuid.uuid4().hex,
+            'payload': payload,
+            'enqueued_at': time.time(),
+        }, ensure_ascii=False, separators=(',', ':'))
+
+
+class JobQueue:
+    name: Optional[str] = None
+    worker_id: Optional[str] = None
+
+    def __init__(self, name: str = 'reservation_jobs', worker_id: str = None):
+        """
+        Durable job queue on a redis list.
+        A dequeued job is moved to the processing list of the worker atomically,
+        so that it survives a worker crash until ack() or recover().
+
+        :param name: name of redis list for pending jobs.
+        :param worker_id: identity of consuming worker. default is '{hostname}-{pid}'.
+        """
+        self.name = name
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+
+    @property
+    def processing_name(self) -> str:
+        return f'{self.name}_processing_{self.worker_id}'
+
+    @property
+    def alive_name(self) -> str:
+        """Name of lease held by the worker while it is alive."""
+        return f'{self.name}_alive_{self.worker_id}'
+
+    def enqueue(self, payload: Dict) -> int:
+        """Push a job and Return queue length."""
+        length = REDIS.lpush(self.name, Job.encode(payload))
+        LOGGER.info(f'[QUEUE] Job enqueued to {self.name}. length: {length}')
+        return length
+
+    def enqueue_many(self, payloads: List[Dict]) -> int:
+        """Push jobs in order with a single command and Return queue length."""
+        length = REDIS.lpush(self.name, *[Job.encode(payload) for payload in payloads])
+        LOGGER.info(f'[QUEUE] {len(payloads)} jobs enqueued to {self.name}. length: {length}')
+        return length
+
+    def dequeue(self, timeout: int = 5) -> Optional[Job]:
+        """Block until a job is popped or timeout seconds passed."""
+        raw = REDIS.brpoplpush(self.name, self.processing_name, timeout=timeout)
+        if raw is None:
+            return None
+        try:
+            return Job(raw)
+        except (ValueError, KeyError):
+            LOGGER.error(f'[QUEUE] Broken job dropped. > {raw}')
+            REDIS.lrem(self.processing_name, 1, raw)
+            return None
+
+    def ack(self, job: Job):
+        """Remove a finished job from the processing list."""
+        REDIS.lrem(self.processing_name, 1, job.raw)
+
+    def recover(self) -> int:
+        """Move jobs left in the processing list of this worker back to the queue. Return moved count."""
+        count = 0
+        while REDIS.rpoplpush(self.processing_name, self.name) is not None:
+            count += 1
+        if count:
+            LOGGER.warning(f'[QUEUE] {count} unfinished jobs of {self.worker_id} moved back to {self.name}')
+        return count
+
+    def alive_workers(self) -> List[str]:
+        """Return ids of workers holding their alive lease."""
+        prefix = f'{self.name}_alive_'
+        return [name[len(prefix):] for name in REDIS.scan_iter(match=f'{prefix}*', count=100)]
+
+    def recover_orphans(self) -> int:
+        """Move jobs left in processing lists of workers not alive any more back to the queue. Return moved count."""
+        prefix, count = f'{self.name}_processing_', 0
+        for processing_name in REDIS.scan_iter(match=f'{prefix}*', count=100):
+            worker_id = processing_name[len(prefix):]
+            if REDIS.exists(f'{self.name}_alive_{worker_id}'):
+                continue
+            moved = 0
+            while REDIS.rpoplpush(processing_name, self.name) is not None:
+                moved += 1
+            if moved:
+                LOGGER.warning(f'[QUEUE] {moved} orphaned jobs of {worker_id} moved back to {self.name}')
+            count += moved
+        return count
+
+    def __len__(self):
+        return REDIS.llen(self.name)
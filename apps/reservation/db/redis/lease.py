@@ -0,0 +1,93 @@
+"""
+Redis lease for exclusive runs across workers.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import logging
+import threading
+import uuid
+from typing import Optional
+
+from apps.reservation.db.redis import REDIS
+
+
+LOGGER = logging.getLogger(__name__)
+
+# KEYS[1]: lease name, ARGV[1]: token, ARGV[2]: ttl milliseconds
+EXTEND_SCRIPT = REDIS.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+""")
+# KEYS[1]: lease name, ARGV[1]: token
+RELEASE_SCRIPT = REDIS.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+
+class RedisLease:
+    name: Optional[str] = None
+    token: Optional[str] = None
+
+    def __init__(self, name: str, ttl: float = 60, heartbeat: bool = True):
+        """
+        Lease held by a single owner across workers.
+        The lease expires after ttl seconds unless it is extended,
+        so a crashed owner does not keep it forever.
+
+        :param name: redis key of the lease.
+        :param ttl: seconds until the lease expires without heartbeat.
+        :param heartbeat: extend the lease from a background thread every ttl / 3 while held.
+        """
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.token = uuid.uuid4().hex
+        self._held = False
+        self._stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    @property
+    def held(self) -> bool:
+        return self._held
+
+    def acquire(self) -> bool:
+        """Try to take the lease without blocking. Return whether it is taken."""
+        self._held = bool(REDIS.set(self.name, self.token, nx=True, px=int(self.ttl * 1000)))
+        if self._held and self.heartbeat:
+            self._stop.clear()
+            self._heartbeat_thread = threading.Thread(
+                target=self._beat, name=f'lease-{self.name}', daemon=True)
+            self._heartbeat_thread.start()
+        return self._held
+
+    def extend(self) -> bool:
+        """Reset TTL of the lease if still owned. Return False if it was lost."""
+        self._held = bool(EXTEND_SCRIPT(keys=[self.name], args=[self.token, int(self.ttl * 1000)]))
+        return self._held
+
+    def release(self):
+        """Give up the lease if still owned."""
+        self._stop.set()
+        if self._held:
+            RELEASE_SCRIPT(keys=[self.name], args=[self.token])
+            self._held = False
+
+    def _beat(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                if not self.extend():
+                    LOGGER.warning(f'[LEASE] {self.name} is lost.')
+                    return
+            except Exception as e:
+                LOGGER.error(f'[LEASE] Failed to extend {self.name}. > {e}')
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,127 @@
+"""
+Redis coordinator sharing a scan run among chats asking the same search.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import json
+import logging
+import threading
+from time import monotonic
+from typing import Dict, Iterator, Optional, Tuple
+
+from apps.reservation.db.redis import REDIS
+from apps.reservation.db.redis.lease import RedisLease
+from config import CONFIG
+
+
+LOGGER = logging.getLogger(__name__)
+RESERV_CONF = CONFIG['APPS']['reservation']
+SCAN_LEASE_TTL = RESERV_CONF.get('run.lease_ttl') or 60
+SCAN_RESULT_TTL = 60  # seconds a finished result is kept for followers joined too late
+HEARTBEAT_INTERVAL = SCAN_LEASE_TTL / 4  # seconds between heartbeats, shorter than idle timeout of followers
+
+
+def scan_key(target: Tuple, quarter: Tuple, facility_type: str, test: bool = False) -> str:
+    """Normalize search condition to a key. The order of target and quarter does not matter."""
+    return '|'.join([
+        facility_type,
+        ','.join(sorted(target)),
+        ','.join(str(q) for q in sorted(quarter)),
+        'test' if test else 'real',
+    ])
+
+
+class ScanCoordinator:
+    key: Optional[str] = None
+
+    def __init__(self, key: str):
+        """
+        Coordinate a scan run by key.
+        The first chat becomes the leader running the browser and publishing events.
+        Other chats asking the same key follow the events instead of running another browser.
+
+        Events are dict of,
+            {'type': 'progress', 'run': str, 'count': int}
+            {'type': 'done', 'run': str, 'title': str or None, 'body': str or None}
+        The leader also publishes heartbeats between sparse progress events, which are not yielded to followers.
+        A run is identified by the lease token of its leader, and its result is kept by run,
+        so that followers of a run never read the result of the next one.
+        """
+        self.key = key
+        self.lease = RedisLease(f'scan_run_{key}', ttl=SCAN_LEASE_TTL)
+        self.channel = f'scan_events_{key}'
+        self.last_run_name = f'scan_last_run_{key}'
+        self._stop_heartbeat = threading.Event()
+
+    def result_name(self, run: str) -> str:
+        return f'scan_result_{self.key}_{run}'
+
+    def lead(self) -> bool:
+        """Try to become the leader. Return whether this runs the scan."""
+        if self.lease.acquire():
+            self._stop_heartbeat.clear()
+            threading.Thread(target=self._heartbeat, name=f'scan-heartbeat-{self.key}', daemon=True).start()
+            return True
+        return False
+
+    def publish_progress(self, count: int):
+        self._publish({'type': 'progress', 'count': count})
+
+    def finish(self, title: Optional[str], body: Optional[str]):
+        """Publish the result to followers and Give up leadership."""
+        self._stop_heartbeat.set()
+        event = {'type': 'done', 'title': title, 'body': body}
+        try:
+            with REDIS.pipeline() as pipe:
+                pipe.set(self.result_name(self.lease.token), json.dumps(event, ensure_ascii=False), ex=SCAN_RESULT_TTL)
+                pipe.set(self.last_run_name, self.lease.token, ex=SCAN_RESULT_TTL)  # For chats joined after it
+                pipe.execute()
+            self._publish(event)
+        finally:
+            self.lease.release()
+
+    def follow(self, idle_timeout: float = SCAN_LEASE_TTL) -> Iterator[Dict]:
+        """
+        Yield events of the leader until 'done'.
+        It stops without 'done' when there is no leader and no result, so that the caller can lead.
+        """
+        pubsub = REDIS.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        try:
+            run = REDIS.get(self.lease.name)  # Run followed, None if no leader right now
+            last_event_at = monotonic()
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    event = json.loads(message['data'])
+                    if run is None:
+                        run = event.get('run')
+                    elif event.get('run') != run:  # Event of another run
+                        continue
+                    last_event_at = monotonic()
+                    if event['type'] == 'heartbeat':
+                        continue
+                    yield event
+                    if event['type'] == 'done':
+                        return
+                    continue
+
+                # Leader finished before subscribed, or died
+                if not REDIS.exists(self.lease.name) or monotonic() - last_event_at > idle_timeout:
+                    run = run or REDIS.get(self.last_run_name)
+                    result = REDIS.get(self.result_name(run)) if run else None
+                    if result is not None:
+                        yield json.loads(result)
+                    return
+        finally:
+            pubsub.close()
+
+    def _publish(self, event: Dict):
+        REDIS.publish(self.channel, json.dumps({**event, 'run': self.lease.token}, ensure_ascii=False))
+
+    def _heartbeat(self):
+        while not self._stop_heartbeat.wait(HEARTBEAT_INTERVAL):
+            try:
+                self._publish({'type': 'heartbeat'})
+            except Exception as e:
+                LOGGER.warning(f'[SCAN] Heartbeat of {self.key} not published. > {e}')
@@ -0,0 +1,126 @@
+"""
+In-process cache for chat sessions.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import logging
+import os
+import socket
+import threading
+import uuid
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, Optional
+
+from apps.reservation.db.redis import REDIS
+from config import CONFIG
+
+
+LOGGER = logging.getLogger(__name__)
+REDIS_CONF = CONFIG['DB']['redis']
+INVALIDATE_CHANNEL = 'chat_session_invalidate'
+
+_SESSION_CACHE: Optional['SessionCache'] = None
+_SESSION_CACHE_LOCK = threading.Lock()
+
+
+class SessionCache:
+    def __init__(self, max_size: int = 1024, ttl: float = 30, channel: str = INVALIDATE_CHANNEL):
+        """
+        Bounded LRU cache of chat session hashes with TTL.
+        Changes by other workers are received from the redis pub/sub channel and evict entries.
+
+        :param max_size: max number of cached sessions. The least recently used one is evicted over this.
+        :param ttl: seconds a cached session is trusted. It must be shorter than redis session TTL,
+            because a cache hit does not reset TTL in redis.
+        :param channel: pub/sub channel of invalidation messages.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.channel = channel
+        self.origin = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # name -> (cached_at, session_info)
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def get(self, name: str) -> Optional[Dict]:
+        """Return a copy of cached session info, None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[name]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return dict(entry[1])
+
+    def set(self, name: str, session_info: Dict):
+        with self._lock:
+            self._entries[name] = (monotonic(), dict(session_info))
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, name: str, publish: bool = True):
+        """Evict name, and Tell other workers to evict it if publish is set."""
+        self._evict(name)
+        if publish:
+            REDIS.publish(self.channel, f'{self.origin} {name}')
+
+    def start_listener(self):
+        """Subscribe invalidation channel in a background thread."""
+        if self._listener is not None:
+            return
+        pubsub = REDIS.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: self._on_message})
+        self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def stats(self) -> Dict:
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    def _evict(self, name: str):
+        with self._lock:
+            if self._entries.pop(name, None) is not None:
+                self.invalidations += 1
+
+    def _on_message(self, message: Dict):
+        origin, _, name = message['data'].partition(' ')
+        if origin != self.origin:
+            self._evict(name)
+
+
+def get_session_cache() -> Optional[SessionCache]:
+    """Return process-wide session cache, None if 'session_cache.enabled' is not set."""
+    global _SESSION_CACHE
+    if not REDIS_CONF.get('session_cache.enabled'):
+        return None
+    if _SESSION_CACHE is None:
+        with _SESSION_CACHE_LOCK:
+            if _SESSION_CACHE is None:
+                cache = SessionCache(
+                    max_size=REDIS_CONF.get('session_cache.size') or 1024,
+                    ttl=REDIS_CONF.get('session_cache.ttl') or 30,
+                )
+                try:
+                    cache.start_listener()
+                except Exception as e:
+                    LOGGER.error(f'[REDIS] Session cache disabled, failed to subscribe invalidation. > {e}')
+                    return None
+                _SESSION_CACHE = cache
+    return _SESSION_CACHE
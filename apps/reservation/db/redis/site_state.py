@@ -0,0 +1,41 @@
+"""
+Redis store of authenticated browser state of yeyak site.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import json
+import logging
+from typing import Dict, List, Optional
+
+from apps.reservation.db.redis import REDIS
+from config import CONFIG
+
+
+LOGGER = logging.getLogger(__name__)
+REDIS_CONF = CONFIG['DB']['redis']
+SITE_STATE_TTL = REDIS_CONF.get('site_state.ttl') or 6 * 60 * 60
+COOKIE_KEYS = ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry')
+
+
+class SiteState:
+    name: Optional[str] = None
+
+    def __init__(self, userid: str, ttl: int = SITE_STATE_TTL):
+        """
+        Cookies of a logged in site session, including site preferences such as language.
+        It is shared by every browser logging in with userid.
+        """
+        self.name = f'yeyak_site_state_{userid}'
+        self.ttl = ttl
+
+    def save(self, cookies: List[Dict]):
+        cookies = [{key: cookie[key] for key in COOKIE_KEYS if key in cookie} for cookie in cookies]
+        REDIS.set(self.name, json.dumps(cookies, ensure_ascii=False, separators=(',', ':')), ex=self.ttl)
+        LOGGER.info(f'[REDIS] {self.name} Saved.')
+
+    def load(self) -> Optional[List[Dict]]:
+        state = REDIS.get(self.name)
+        return json.loads(state) if state is not None else None
+
+    def delete(self):
+        REDIS.delete(self.name)
@@ -0,0 +1,57 @@
+"""
+Redis snapshot of facility availability observed by yeyak scans.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from apps.reservation.db.redis import REDIS
+from config import CONFIG
+
+
+LOGGER = logging.getLogger(__name__)
+REDIS_CONF = CONFIG['DB']['redis']
+SNAPSHOT_TTL = REDIS_CONF.get('snapshot.ttl') or 10 * 60
+
+
+def _encode(data: Dict) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class AvailabilitySnapshot:
+    def __init__(self, ttl: int = SNAPSHOT_TTL):
+        """
+        Last observed facility options and calendars, shared by every scan and chat.
+        Each record is compact json of {'t': observed unix time, ...} and expires after ttl seconds.
+
+        Facility options: 'o' is [[value, text], ...]
+        Facility calendar: 'd' is {ymd: [start_hm, ...] or null if time slots were not opened}
+        """
+        self.ttl = ttl
+
+    def save_options(self, facility_type: str, options: List[Tuple[str, str]]):
+        REDIS.set(f'yeyak_snapshot_options_{facility_type}',
+                  _encode({'t': int(time.time()), 'o': options}), ex=self.ttl)
+
+    def load_options(self, facility_type: str) -> Optional[Tuple[int, List[Tuple[str, str]]]]:
+        """Return (observed time, options), None if there is no fresh snapshot."""
+        record = REDIS.get(f'yeyak_snapshot_options_{facility_type}')
+        if record is None:
+            return None
+        data = json.loads(record)
+        return data['t'], [tuple(option) for option in data['o']]
+
+    def save_calendar(self, facility_value: str, dates: Dict[str, Optional[List[str]]]):
+        REDIS.set(f'yeyak_snapshot_calendar_{facility_value}',
+                  _encode({'t': int(time.time()), 'd': dates}), ex=self.ttl)
+
+    def load_calendar(self, facility_value: str) -> Optional[Tuple[int, Dict[str, Optional[List[str]]]]]:
+        """Return (observed time, dates), None if there is no fresh snapshot."""
+        record = REDIS.get(f'yeyak_snapshot_calendar_{facility_value}')
+        if record is None:
+            return None
+        data = json.loads(record)
+        return data['t'], data['d']
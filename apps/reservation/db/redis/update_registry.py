@@ -0,0 +1,41 @@
+"""
+Redis registry of processed telegram updates.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import logging
+from datetime import timedelta
+from typing import List
+
+from apps.reservation.db.redis import REDIS
+from config import CONFIG
+
+
+LOGGER = logging.getLogger(__name__)
+REDIS_CONF = CONFIG['DB']['redis']
+UPDATE_TTL = timedelta(seconds=REDIS_CONF.get('update.ttl') or 24 * 60 * 60)
+
+
+class UpdateRegistry:
+    def __init__(self, prefix: str = 'telegram_update', ttl: timedelta = UPDATE_TTL):
+        """
+        Record telegram update_id once, so that a redelivered update is not processed again.
+        Telegram retries a delivery for a limited time, so records expire after ttl.
+        """
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def register(self, update_id) -> bool:
+        """Record update_id atomically. Return False if it was already recorded."""
+        return bool(REDIS.set(f'{self.prefix}_{update_id}', 1, nx=True, ex=self.ttl))
+
+    def register_many(self, update_ids: List) -> List[bool]:
+        """Record update_ids in a single round trip. Return whether each of them is newly recorded."""
+        with REDIS.pipeline(transaction=False) as pipe:
+            for update_id in update_ids:
+                pipe.set(f'{self.prefix}_{update_id}', 1, nx=True, ex=self.ttl)
+            return [bool(result) for result in pipe.execute()]
+
+    def unregister(self, update_id):
+        """Forget update_id so that its redelivery is processed, e.g. when it failed before any work."""
+        REDIS.delete(f'{self.prefix}_{update_id}')
@@ -0,0 +1,41 @@
+"""
+Facility matching rules of seoul yeyak site, without any browser dependency.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import functools
+from datetime import datetime
+from time import time
+from typing import List, Tuple
+
+
+SOCCER_CODE = 'T107'  # Facility type code of soccer field
+
+
+def kst_datetime(timestamp: float = None) -> datetime:
+    """Return aware datetime in KST of unix timestamp, now if None."""
+    import pytz  # Imported on first use, apart from app startup
+    return datetime.fromtimestamp(time() if timestamp is None else timestamp, tz=pytz.timezone('Asia/Seoul'))
+
+
+def adjust_start_hour(start_hm: str, weekday: int) -> int:
+    """Translate 'HH:MM' to start hour compared with quarter start times. Sunday is shifted by 18."""
+    start_hour = int(start_hm.split(':')[0])
+    if weekday == 6:  # Adjust start_hour for sunday
+        start_hour += 18
+    return start_hour
+
+
+def match_facility_options(options: List[Tuple[str, str]], target: Tuple, target_weekend: Tuple) -> List[Tuple]:
+    """Filter (value, text) options whose text contains any target keyword and any weekend keyword."""
+    return [
+        (value, text)
+        for value, text in options
+        # Whether the facility-name(text) contains target keywords and target weekend keywords
+        if functools.reduce(
+            lambda x, y: x or y,
+            [keyword in text for keyword in target]
+        ) and functools.reduce(
+            lambda x, y: x or y,
+            [weekend_keyword in text for weekend_keyword in target_weekend])
+    ]
@@ -1,9 +1,14 @@
 import logging
-from typing import Union, Dict, List, Tuple
+from typing import Union, Dict, List, Optional, Tuple
 
 from apps.flasklib import deprecated
 from apps.telegrambot import TelegramBot
-from apps.reservation.yeyak import YeyakHandler
+from apps.telegramlib import ProgressReporter
+from apps.reservation.facility import match_facility_options, kst_datetime, SOCCER_CODE
+from apps.reservation.scanner import FacilityScanner, HTTP_YEYAK_CONF
+from apps.reservation.db.redis.lease import RedisLease
+from apps.reservation.db.redis.scan_coordinator import ScanCoordinator, scan_key
+from apps.reservation.db.redis.snapshot import AvailabilitySnapshot
 
 from config import CONFIG
 
@@ -11,6 +16,8 @@ from config import CONFIG
 LOGGER = logging.getLogger(__name__)
 RESERV_CONF = CONFIG['APPS']['reservation']
 RESERV_WEBHOOK_DOMAIN = f'{RESERV_CONF["telegram.webhook.SEND_URL"]}{RESERV_CONF["telegram.bot.API_TOKEN"]}'
+HEAVY_COMMANDS = ('/yeyak', '/testyeyak', '/search')  # Commands running a browser
+RUN_LEASE_TTL = RESERV_CONF.get('run.lease_ttl') or 60  # seconds a crashed run keeps the chat locked
 
 
 class ReservationBot(TelegramBot):
@@ -38,6 +45,8 @@ class ReservationBot(TelegramBot):
         :return body:
             Body of response text, string type.
         """
+        from apps.reservation.yeyak import get_yeyak_pool  # Import selenium on first browser run
+
         title, body, additional_word = None, None, args[0] if args else None
 
         if command == '/start':
@@ -55,52 +64,53 @@ class ReservationBot(TelegramBot):
                 )
                 self.send_response()
 
-                # Get handler and Open base yeyak url
-                yeyak_handler = YeyakHandler()
-                yeyak_handler.open()
-
-                # Search open facilities using param
-                facilities = []
-                for result in yeyak_handler.search_facility(facility_name, weektime, additional_word):  # Use generator
-                    if result and isinstance(result, int):
-                        self.set_response(resp_title=f'{result}회 검색')
-                        self.send_response()
-                    elif result and isinstance(result, list):
-                        facilities = result
-
-                # Send message of search result
-                new_line = '\n'
-                body_tail = f'{new_line}{new_line}예약하려면, "/yeyak {facility_name} {weektime} [추가검색어]"'\
-                    if len(facilities) > 1 else ''
-                self.set_response(
-                    resp_title=f'~ 축구장 검색 결과 ~',
-                    resp_body=f'{new_line.join([f[1] for f in facilities])}'
-                              f'{"(결과 없음)" if not facilities else body_tail}',
-                )
-                self.send_response()
-
-                # Activate yeyak there is only one result
-                if len(facilities) == 1:
+                # Check out a browser, Give it back to pool even if the run fails
+                with get_yeyak_pool().handler() as yeyak_handler:
+                    # Open base yeyak url
+                    yeyak_handler.open()
+
+                    # Search open facilities using param
+                    facilities, progress = [], self.progress_reporter()
+                    try:
+                        search = yeyak_handler.search_facility(facility_name, weektime, additional_word)
+                        for result in search:  # Use generator
+                            if result and isinstance(result, int):
+                                progress.update(f'{result}회 검색')
+                            elif result and isinstance(result, list):
+                                facilities = result
+                    finally:
+                        progress.close()
+
+                    # Send message of search result
+                    new_line = '\n'
+                    body_tail = f'{new_line}{new_line}예약하려면, "/yeyak {facility_name} {weektime} [추가검색어]"'\
+                        if len(facilities) > 1 else ''
                     self.set_response(
-                        resp_title=f'"{facilities[0][1]}" 예약을 시작합니다.',
+                        resp_title=f'~ 축구장 검색 결과 ~',
+                        resp_body=f'{new_line.join([f[1] for f in facilities])}'
+                                  f'{"(결과 없음)" if not facilities else body_tail}',
                     )
                     self.send_response()
 
-                    # Login action, Send message
-                    yeyak_handler.login()
-                    self.set_response(resp_title='로그인 성공.')
-                    self.send_response()
+                    # Activate yeyak there is only one result
+                    if len(facilities) == 1:
+                        self.set_response(
+                            resp_title=f'"{facilities[0][1]}" 예약을 시작합니다.',
+                        )
+                        self.send_response()
 
-                    # Action
-                    yeyak_handler.yeyak_facility(facility_name, weektime, additional_word)
+                        # Login action, Send message
+                        yeyak_handler.login()
+                        self.set_response(resp_title='로그인 성공.')
+                        self.send_response()
 
-                    # Logout action, Send message
-                    yeyak_handler.logout()
-                    self.set_response(resp_title='로그아웃 성공.')
-                    self.send_response()
+                        # Action
+                        yeyak_handler.yeyak_facility(facility_name, weektime, additional_word)
 
-                # Close and Quit browser
-                yeyak_handler.quit()
+                        # Logout action, Send message
+                        yeyak_handler.logout()
+                        self.set_response(resp_title='로그아웃 성공.')
+                        self.send_response()
 
                 # Final message
                 title, body = f'완료됐습니다!', None
@@ -115,25 +125,23 @@ class ReservationBot(TelegramBot):
                 )
                 self.send_response()
 
-                # Get handler and Open base yeyak url
-                yeyak_handler = YeyakHandler()
-                yeyak_handler.open()
-
-                # Login action, Send message
-                yeyak_handler.login()
-                self.set_response(resp_title='로그인 성공.')
-                self.send_response()
+                # Check out a browser, Give it back to pool even if the run fails
+                with get_yeyak_pool().handler() as yeyak_handler:
+                    # Open base yeyak url
+                    yeyak_handler.open()
 
-                # Action
-                yeyak_handler.yeyak_facility(facility_name, weektime, additional_word)
+                    # Login action, Send message
+                    yeyak_handler.login()
+                    self.set_response(resp_title='로그인 성공.')
+                    self.send_response()
 
-                # Logout action, Send message
-                yeyak_handler.logout()
-                self.set_response(resp_title='로그아웃 성공.')
-                self.send_response()
+                    # Action
+                    yeyak_handler.yeyak_facility(facility_name, weektime, additional_word)
 
-                # Close and Quit browser
-                yeyak_handler.quit()
+                    # Logout action, Send message
+                    yeyak_handler.logout()
+                    self.set_response(resp_title='로그아웃 성공.')
+                    self.send_response()
 
                 # Final message
                 title, body = f'예약 완료됐습니다!', '(예약정보)'
@@ -161,27 +169,92 @@ class ReservationBot(TelegramBot):
         self.set_response(resp_title=f'예약 가능한 시설을 검색합니다. (최대 100회 탐색)')
         self.send_response()
 
-        # Open domain site in browser
-        yeyak_handler = YeyakHandler()
-        if 'test' in kwargs and kwargs['test']:
-            yeyak_handler.test = kwargs['test']
-        yeyak_handler.open()
-
-        # Search and Reserve valid facility
+        # Share a run with other chats searching the same condition
+        test = bool(kwargs.get('test'))
         target, quarter = ('송파구여성', '잠실유수지', '보라매'), (7, 8, 12, 13, 14)  # TODO: Make these to CONFIG variables
-        for result in yeyak_handler.yeyak(target, quarter, self.username):  # Use generator
-            if result and isinstance(result, int):
-                self.set_response(resp_title=f'{result}회 검색중...')
-                self.send_response()
-            elif result and isinstance(result, Tuple) and len(result) == 2:  # title, body
-                title, body = result
+        coordinator = ScanCoordinator(scan_key(target, quarter, SOCCER_CODE, test))
+        progress, following = self.progress_reporter(), False
+        try:
+            while True:
+                if coordinator.lead():
+                    title, body = self._run_yeyak(coordinator, progress, target, quarter, test)
+                    break
 
-        # Close and Quit browser
-        yeyak_handler.quit()
+                if not following:
+                    LOGGER.info(f'[{self.chat_id}][{self.username}] Follow scan run of {coordinator.key}')
+                    self.set_response(resp_title='같은 조건의 검색이 진행 중입니다. 결과를 함께 받습니다.')
+                    self.send_response()
+                    following = True
+
+                done = False
+                for event in coordinator.follow():
+                    if event['type'] == 'progress':
+                        progress.update(f'{event["count"]}회 검색중...')
+                    elif event['type'] == 'done':
+                        title, body, done = event['title'], event['body'], True
+                if done:
+                    break
+                # Leader is gone without result, Try to lead
+        finally:
+            progress.close()  # Do not leave the progress message behind on errors
 
         # Final message
         return title, body
 
+    def _execute_status(self) -> Tuple:
+        """Return facilities matched with target in the last observed snapshot."""
+        snapshot = AvailabilitySnapshot().load_options(SOCCER_CODE)
+        if snapshot is None:
+            return '최근 검색 기록이 없습니다.', '"/testyeyak" 으로 검색해 보세요.'
+
+        observed_at, options = snapshot
+        target, target_weekend = ('송파구여성', '잠실유수지', '보라매'), ('주말', '토, ', ', 일')
+        matched = match_facility_options(options, target, target_weekend)
+        new_line = '\n'
+        return f'~ 최근 검색 결과 ({kst_datetime(observed_at).strftime("%H:%M:%S")}) ~', \
+               f'{new_line.join([m[1] for m in matched]) if matched else "(결과 없음)"}'
+
+    def _run_yeyak(self, coordinator: ScanCoordinator, progress: ProgressReporter,
+                   target: Tuple, quarter: Tuple, test: bool) -> Tuple:
+        """Run scan in a browser as leader of coordinator and Publish its progress and result."""
+        from apps.reservation.yeyak import get_yeyak_pool  # Import selenium on first browser run
+
+        title, body = None, None
+        try:
+            # Check out a warm browser and Open domain site
+            with get_yeyak_pool().handler() as yeyak_handler:
+                yeyak_handler.test = test
+                yeyak_handler.start_trace(update_id=self.update_id, chat_id=self.chat_id, test=test)
+                yeyak_handler.open()
+
+                # Search and Reserve valid facility
+                scanner = FacilityScanner() if HTTP_YEYAK_CONF.get('enabled') else None
+                try:
+                    for result in yeyak_handler.yeyak(target, quarter, self.username, scanner):  # Use generator
+                        if result and isinstance(result, int):
+                            progress.update(f'{result}회 검색중...')
+                            coordinator.publish_progress(result)
+                        elif result and isinstance(result, Tuple) and len(result) == 2:  # title, body
+                            title, body = result
+                finally:
+                    yeyak_handler.finish_trace()  # Export trace of failed runs as well
+        finally:
+            coordinator.finish(*self._follower_result(title, body, test))
+        return title, body
+
+    @staticmethod
+    def _follower_result(title: Optional[str], body: Optional[str], test: bool) -> Tuple:
+        """
+        Return result of a run for followers. It tells the facility and time found,
+        but not the booker of the leader, since only the leader chat is booked.
+        """
+        if title is None:
+            return title, body
+        found = '\n'.join(line for line in (body or '').split('\n') if line.startswith(('- 시설명', '- 일시')))
+        if test:
+            return '[TEST] 같은 조건의 검색에서 예약 가능한 시설을 찾았습니다.', found
+        return '같은 조건의 다른 요청으로 예약이 진행되었습니다.', f'{found}\n(이 채팅의 예약은 진행되지 않았습니다.)'
+
     @deprecated
     def _execute_onestep(self, command: str, **kwargs):
         import time
@@ -393,20 +466,39 @@ class ReservationBot(TelegramBot):
         """Take action and Return send_result."""
         if self.bot_status == 2:  # Status of bot_command
             command, *args = self.text.split(' ')
-            if command == '/start':
-                title = f'하이, {self.username}👋. 예약 봇을 시작합니다.'
-                body = '예약하려면 "/yeyak" 을, 테스트하려면 "/testyeyak" 을 입력하세요.'
-            elif command == '/yeyak':  # Reserve at once
-                # title, body = self._execute_onestep(command)
-                title, body = self._execute_yeyak(command)
-            elif command == '/testyeyak':  # Check possibility
-                # title, body = self._execute_onestep(command='/yeyak', test=True)
-                title, body = self._execute_yeyak(command='/yeyak', test=True)
-            elif command == '/disconnect':
-                title, body = f'Bye, {self.username}', None
-            else:  # Legacy condition
-                title, body = self._make_contents(command, *args)
+            if command in HEAVY_COMMANDS:
+                # Single flight by chat, a browser run at a time
+                lease = RedisLease(f'chat_run_{self.chat_id}', ttl=RUN_LEASE_TTL)
+                if lease.acquire():
+                    try:
+                        title, body = self._execute_command(command, *args)
+                    finally:
+                        lease.release()
+                else:
+                    LOGGER.info(f'[{self.chat_id}][{self.username}] {command} rejected, a run is in progress.')
+                    title, body = '이미 진행 중인 예약이 있습니다.', '진행 중인 예약이 끝난 후 다시 시도해 주세요.'
+            else:
+                title, body = self._execute_command(command, *args)
             self.set_response(resp_title=title, resp_body=body)
 
         send_result = self.send_response()
         return {'ok': send_result}
+
+    def _execute_command(self, command: str, *args) -> Tuple:
+        """Execute bot command and Return title, body of response."""
+        if command == '/start':
+            title = f'하이, {self.username}👋. 예약 봇을 시작합니다.'
+            body = '예약하려면 "/yeyak" 을, 테스트하려면 "/testyeyak" 을 입력하세요.'
+        elif command == '/yeyak':  # Reserve at once
+            # title, body = self._execute_onestep(command)
+            title, body = self._execute_yeyak(command)
+        elif command == '/testyeyak':  # Check possibility
+            # title, body = self._execute_onestep(command='/yeyak', test=True)
+            title, body = self._execute_yeyak(command='/yeyak', test=True)
+        elif command == '/status':  # Answer from snapshot without browser
+            title, body = self._execute_status()
+        elif command == '/disconnect':
+            title, body = f'Bye, {self.username}', None
+        else:  # Legacy condition
+            title, body = self._make_contents(command, *args)
+        return title, body
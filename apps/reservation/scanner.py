@@ -0,0 +1,125 @@
+"""
+Browser-free availability scanner for seoul yeyak site.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import logging
+import requests
+from html.parser import HTMLParser
+from typing import List, Tuple, Dict, Optional
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from config import CONFIG
+
+
+LOGGER = logging.getLogger(__name__)
+HTTP_YEYAK_CONF = CONFIG['VAL']['seoul.yeyak'].get('http') or {}
+
+_SESSION: Optional[requests.Session] = None
+
+
+def get_http_session() -> requests.Session:
+    """Return process-wide session keeping pooled keep-alive connections to the yeyak site."""
+    global _SESSION
+    if _SESSION is None:
+        pool_size = HTTP_YEYAK_CONF.get('pool_size') or 10
+        _SESSION = requests.Session()
+        _SESSION.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+        _SESSION.mount('http://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    return _SESSION
+
+
+class _OptionParser(HTMLParser):
+    """Collect (value, text) of every <option> in a html fragment."""
+    def __init__(self):
+        super().__init__()
+        self.options: List[Tuple[str, str]] = []
+        self._value: Optional[str] = None
+        self._text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'option':
+            self._close_option()
+            self._value = dict(attrs).get('value') or ''
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag in ('option', 'select'):
+            self._close_option()
+
+    def handle_data(self, data):
+        if self._value is not None:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._close_option()
+
+    def _close_option(self):
+        if self._value is not None:
+            self.options.append((self._value, ''.join(self._text).strip()))
+            self._value, self._text = None, []
+
+
+class FacilityScanner:
+    def __init__(self, url: str = None, session: requests.Session = None):
+        """
+        Fetch the facility list of a facility type over plain http.
+        It answers the same question as selecting 'xpath.select_facility_type' in the browser.
+
+        :param url: facility list url. default is 'http.url.facilities' of seoul.yeyak config.
+        :param session: requests session to use. default is the process-wide pooled session.
+        """
+        self.url = url or HTTP_YEYAK_CONF.get('url.facilities')
+        if not self.url:
+            raise ValueError(f'[SCANNER] No facility list url configured.')
+
+        self.session = session or get_http_session()
+        self.param_facility_type = HTTP_YEYAK_CONF.get('param.facility_type') or 'code'
+        self.timeout = HTTP_YEYAK_CONF.get('timeout') or 5
+        self._cookies: Dict[str, str] = {}
+
+    def update_cookies(self, cookies: List[Dict]):
+        """Reuse cookies from webdriver.get_cookies() so that http calls share the browser login."""
+        self._cookies = {cookie['name']: cookie['value'] for cookie in cookies}
+
+    def scan(self, facility_type: str) -> List[Tuple[str, str]]:
+        """
+        Return (value, text) of every facility listed for facility_type.
+        Empty list is returned when the site does not answer properly.
+        """
+        try:
+            response = self.session.get(
+                self.url,
+                params={self.param_facility_type: facility_type},
+                cookies=self._cookies,
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except RequestException as e:
+            LOGGER.error(f'[SCANNER] Error occurred while fetching facility list. > {e}')
+            return []
+
+        try:
+            if 'json' in response.headers.get('Content-Type', ''):
+                return self._parse_json(response.json())
+            return self._parse_html(response.text)
+        except (ValueError, KeyError, TypeError) as e:  # e.g. broken json, or a list item without configured keys
+            LOGGER.error(f'[SCANNER] Improper facility list answered. > {type(e).__name__}: {e}')
+            return []
+
+    @staticmethod
+    def _parse_html(text: str) -> List[Tuple[str, str]]:
+        parser = _OptionParser()
+        parser.feed(text)
+        parser.close()
+        return parser.options
+
+    @staticmethod
+    def _parse_json(data) -> List[Tuple[str, str]]:
+        key_value = HTTP_YEYAK_CONF.get('json.value') or 'value'
+        key_text = HTTP_YEYAK_CONF.get('json.text') or 'text'
+        if isinstance(data, dict):
+            data = data.get(HTTP_YEYAK_CONF.get('json.list') or 'list') or []
+        return [(str(item[key_value]), str(item[key_text])) for item in data]
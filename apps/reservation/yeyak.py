@@ -1,13 +1,21 @@
 import logging
-import functools
-import pytz
+import threading
 from datetime import datetime, timedelta, time
+from queue import Queue, Empty
+from time import monotonic
 from typing import Tuple, Optional
 
 from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException, WebDriverException
 
 from apps.flasklib import deprecated
-from apps.seleniumlib import ChromeDriverHandler
+from apps.seleniumlib import ChromeDriverHandler, SeleniumHandlerPool, HandlerPoolTimeoutError, deco_implicit_wait
+from apps.metrics import BROWSERS, SCAN_ITERATIONS, SCAN_TIME_TO_MATCH
+from apps.reservation.scanner import FacilityScanner
+from apps.reservation.facility import SOCCER_CODE, adjust_start_hour, kst_datetime, match_facility_options
+from apps.reservation.db.redis.snapshot import AvailabilitySnapshot
+from apps.reservation.db.redis.site_state import SiteState
 
 from config import CONFIG
 
@@ -16,19 +24,42 @@ LOGGER = logging.getLogger(__name__)
 AUTH_CONF = CONFIG['AUTH']['reservation']
 CHROME_YEYAK_CONF = CONFIG['VAL']['seoul.yeyak']['chrome']
 FIREFOX_YEYAK_CONF = CONFIG['VAL']['seoul.yeyak']['firefox']
+POOL_CONF = CONFIG['VAL']['selenium']
+FACILITY_LOAD_TIMEOUT = CHROME_YEYAK_CONF.get('wait.facilities') or 3  # seconds to wait facility options reloaded
+SLOT_LOAD_TIMEOUT = CHROME_YEYAK_CONF.get('wait.time_slots') or 3  # seconds to wait time slots of a date
+POLL_INTERVAL = CHROME_YEYAK_CONF.get('poll_interval') or 1  # seconds between scan iterations
+KEEP_SESSION = CHROME_YEYAK_CONF.get('session.keep') is not False  # Skip logout so that the next run reuses the login
+SESSION_CHECK_TIMEOUT = CHROME_YEYAK_CONF.get('wait.session') or 3  # seconds to check restored session
+PARALLEL_FAN_OUT = CHROME_YEYAK_CONF.get('parallel.fan_out') or 1  # browsers evaluating facilities at once
+SNAPSHOT_SKIP_AGE = CHROME_YEYAK_CONF.get('snapshot.skip_age') or 0  # seconds, 0 never skips by snapshot
+LEGACY_IMPLICIT_WAIT = 5  # seconds of implicit wait kept for deprecated flows without explicit waits
+
+_YEYAK_POOL: Optional[SeleniumHandlerPool] = None
+
+# Locators of yeyak site
+BTN_YEYAK_MAIN = (By.XPATH, '/html/body/div/div[3]/div[1]/div[1]/div/div/div[2]/div[1]/button')  # 예약하기(1)
+BTN_YEYAK_DETAIL = (By.XPATH, '/html/body/div/div[3]/div[2]/div/form[2]/div[1]/div[2]/div/div/a[1]')  # 예약하기(2)
+BTN_YEYAK_SUBMIT = (By.XPATH, '/html/body/div/div[3]/div[2]/div/div[1]/form/div[3]/div[3]/div/div[3]/button')
+LABEL_GROUP = (By.XPATH, '/html/body/div/div[3]/div[2]/div/div[1]/form/div[3]'
+                         '/div[2]/div[5]/table/tbody/tr[1]/td/span[2]/label')  # Radio label for '단체'
+POPUP_CLOSE = (By.CLASS_NAME, 'pop_x')
+CALENDAR_ABLE = (By.CSS_SELECTOR, '.tbl_cal .able a')
+TIME_SLOT = (By.CSS_SELECTOR, '.tab-all a')
+AGREE_LABELS = (By.CSS_SELECTOR, '.book_tit2 label')
 
 
 class YeyakHandler(ChromeDriverHandler):
     def __init__(self):
         super().__init__(url=CHROME_YEYAK_CONF['url'])
+        self.snapshot = AvailabilitySnapshot()
+        self.site_state = SiteState(AUTH_CONF['seoul.yeyak.id'])
 
     def login(self, userid: str = None, password: str = None):
         # Go to login page
-        elem = self.search_by_xpath(CHROME_YEYAK_CONF['xpath.btn_login'])
-        self.click_elem(elem=self.search_by_xpath(CHROME_YEYAK_CONF['xpath.btn_login']))
+        self.click_elem(elem=self.wait_clickable((By.XPATH, CHROME_YEYAK_CONF['xpath.btn_login'])))
 
         # Insert id, pwd
-        input_userid = self.search_by_xpath(CHROME_YEYAK_CONF['xpath.input_userid'])
+        input_userid = self.wait_for((By.XPATH, CHROME_YEYAK_CONF['xpath.input_userid']), condition='visibility')
         self.send_keys_to_elem(
             elem=input_userid,
             key=userid if userid else AUTH_CONF['seoul.yeyak.id']
@@ -39,14 +70,77 @@ class YeyakHandler(ChromeDriverHandler):
             key=password if password else AUTH_CONF['seoul.yeyak.password']
         )
 
-        # Click submit button
+        # Click submit button, Wait until logged in
         self.click_elem(self.search_by_xpath(CHROME_YEYAK_CONF['xpath.btn_login_submit']))
+        self.wait_for((By.XPATH, CHROME_YEYAK_CONF['xpath.btn_logout']))
 
     def logout(self):
-        # Click logout button
-        self.click_elem(self.search_by_xpath(CHROME_YEYAK_CONF['xpath.btn_logout']))
+        # Click logout button, Saved session is not valid anymore
+        self.click_elem(self.wait_clickable((By.XPATH, CHROME_YEYAK_CONF['xpath.btn_logout'])))
+        self.site_state.delete()
+
+    def start_session(self, reopen: bool = True):
+        """
+        Open home site, Set to version of Korean and Login.
+        A session saved by a previous run is restored instead, and login is done only if it is expired.
+        """
+        if reopen:
+            self.open()
+        with self.phase('session'):
+            restored = self.restore_session()
+        if restored:
+            LOGGER.info(f'[YEYAK] Saved session restored.')
+            return
+        with self.phase('language'):
+            self.set_korean()
+        with self.phase('login'):
+            self.login()
+            self.site_state.save(self.driver.get_cookies())
+
+    def restore_session(self) -> bool:
+        """Reuse logged in session of this browser or cookies saved in redis. Return whether logged in."""
+        logout_button = (By.XPATH, CHROME_YEYAK_CONF['xpath.btn_logout'])
+        if self.is_present(logout_button):  # Still logged in, e.g. pooled browser
+            return True
+
+        cookies = self.site_state.load()
+        if not cookies:
+            return False
+        self.driver.delete_all_cookies()
+        for cookie in cookies:
+            try:
+                self.driver.add_cookie(cookie)
+            except WebDriverException as we:
+                LOGGER.warning(f'[YEYAK] Cookie not restored, {cookie.get("name")}. > {we}')
+        self.open()
+        try:
+            self.wait_for(logout_button, timeout=SESSION_CHECK_TIMEOUT)
+        except TimeoutException:
+            LOGGER.info(f'[YEYAK] Saved session expired.')
+            self.site_state.delete()
+            self.driver.delete_all_cookies()
+            self.open()
+            return False
+        return True
+
+    def set_korean(self):
+        """Set to version of Korean and Wait until the page is reloaded."""
+        page = self.search_by_tag_name('html')
+        self.click_elem(self.wait_clickable((By.XPATH, CHROME_YEYAK_CONF['xpath.lang_tit'])))
+        self.click_elem(self.wait_clickable((By.XPATH, CHROME_YEYAK_CONF['xpath.lang_kor'])))
+        self.wait_staleness(page)
+
+    def clear_popups(self):
+        """Close every popup shown right now. No wait if there is no popup."""
+        for popup in self.find_present(POPUP_CLOSE):
+            LOGGER.info(f'[YEYAK] Click existing popup')
+            try:
+                self.click_elem(popup)
+            except Exception:
+                LOGGER.error(f'[YEYAK] An error occurred clicking popup button')
 
     @deprecated
+    @deco_implicit_wait(LEGACY_IMPLICIT_WAIT)
     def search_facility(self, facility_name: str, weektime: str, additional_word: str = None):
         LOGGER.info(f'[SEARCH] Start searching with {facility_name}, {weektime}...')
 
@@ -89,6 +183,7 @@ class YeyakHandler(ChromeDriverHandler):
         LOGGER.info(f'[SEARCH] Done. search count of {len(options)}')
 
     @deprecated
+    @deco_implicit_wait(LEGACY_IMPLICIT_WAIT)
     def yeyak_facility(self, facility_name: str, weektime: str, additional_word: str = None):
         word = f', {additional_word}'
         LOGGER.info(
@@ -149,13 +244,17 @@ class YeyakHandler(ChromeDriverHandler):
 
             self.sleep(3)
 
-    def yeyak(self, target: Optional[Tuple], quarter: Optional[Tuple], username: str) -> Optional[Tuple]:
-        title, body = '검색 결과가 없습니다. 다시 시도해 주세요.', None
+    def yeyak(self, target: Optional[Tuple], quarter: Optional[Tuple], username: str,
+              scanner: Optional[FacilityScanner] = None, facility_type: str = SOCCER_CODE) -> Optional[Tuple]:
+        """
+        Search facilities by target and Register the first one matched with quarter.
+        It yields search count every 10 times and (title, body) when registered.
 
-        # Set to version of Korean
-        self.click_elem(self.search_by_xpath(CHROME_YEYAK_CONF['xpath.lang_tit']))
-        self.click_elem(self.search_by_xpath(CHROME_YEYAK_CONF['xpath.lang_kor']))
-        self.sleep(2)
+        :param scanner:
+            If set, the facility list is polled over http by the scanner
+            and the browser is engaged only after a matched facility is listed.
+        """
+        title, body = '검색 결과가 없습니다. 다시 시도해 주세요.', None
 
         if not target:
             target = ('송파구여성', '잠실유수지', '보라매')
@@ -165,34 +264,38 @@ class YeyakHandler(ChromeDriverHandler):
             quarter = (7, 8, 12, 13, 14)
         quarter_start_times = tuple([q*2+4 for q in quarter])  # Translate to time quarter
 
-        # Login action
-        self.login()
+        # Set to version of Korean, Login action
+        self.start_session(reopen=False)
+        if scanner is not None:
+            scanner.update_cookies(self.driver.get_cookies())
 
         # Search by target
-        soccer_code, cnt = 'T107', 0
+        cnt, mode, started_at = 0, 'browser' if scanner is None else 'http', monotonic()
         while cnt < 100:
-            # Select facility type to soccer
-            self.action_select(self.search_by_xpath(CHROME_YEYAK_CONF['xpath.select_facility_type']), soccer_code)
-            self.sleep(2)
-
-            # Search option by target
-            select_elem = self.search_by_xpath(CHROME_YEYAK_CONF['xpath.select_facilities'])
-            options = [
-                (option.get_property('value'), option.text)
-                for option in self.search_many_by_tag_name('option', select_elem)
-                # Whether the facility-name(option.text) contains target keywords and target weekend keywords
-                if functools.reduce(
-                    lambda x, y: x or y,
-                    [keyword in option.text for keyword in target]
-                ) and functools.reduce(
-                    lambda x, y: x or y,
-                    [weekend_keyword in option.text for weekend_keyword in target_weekend])
-            ]
+            with self.phase('scan', iteration=cnt + 1):
+                if scanner is not None:
+                    # Search option by target over http, Open browser only if matched
+                    all_options = scanner.scan(facility_type)
+                    options = match_facility_options(all_options, target, target_weekend)
+                    select_elem = self._select_facility_type(facility_type, reopen=True) if options else None
+                else:
+                    # Select facility type, Search option by target
+                    select_elem = self._select_facility_type(facility_type)
+                    all_options = self.extract_options(select_elem)
+                    options = match_facility_options(all_options, target, target_weekend)
+                if all_options:  # Keep the last snapshot if the list was not loaded, e.g. failed http scan
+                    self.snapshot.save_options(facility_type, all_options)
+            SCAN_ITERATIONS.inc(mode=mode)
 
             if options:
                 LOGGER.info(f'[YEYAK] searched! > {options}')
+                if started_at is not None:  # First match of the run
+                    SCAN_TIME_TO_MATCH.observe(monotonic() - started_at, mode=mode)
+                    started_at = None
                 # Check and Registration!!
-                result = self._register_facility(options, select_elem, quarter_start_times, username)
+                with self.phase('register', facilities=len(options)):
+                    result = self._register_facility(
+                        options, select_elem, quarter_start_times, username, facility_type)
                 if result[0] is not None and result[1] is not None:  # if contents existing
                     yield result
                     LOGGER.info(f'[YEYAK] Done.')
@@ -206,99 +309,295 @@ class YeyakHandler(ChromeDriverHandler):
 
             # Reload page
             LOGGER.info(f'[YEYAK][{cnt + 1}] no result. refresh page')
-            self.sleep(1)
-            self.open()  # Open home site
+            with self.phase('poll'):
+                self.sleep(POLL_INTERVAL)
+                if scanner is None:
+                    self.open()  # Open home site
             cnt += 1
 
-        # Logout action
-        self.logout()
+        # Logout action, unless the session is kept for the next run
+        if not KEEP_SESSION:
+            if scanner is not None:
+                self.open()
+            self.logout()
+
+        network_stats = self.network_stats()
+        if network_stats is not None:
+            LOGGER.info(f'[YEYAK] Network of run > {network_stats}')
+
+    def _select_facility_type(self, facility_type: str, reopen: bool = False):
+        """Select facility type in browser and Return select element of facilities."""
+        if reopen:
+            self.open()  # Open home site
+        facilities = (By.XPATH, CHROME_YEYAK_CONF['xpath.select_facilities'])
+        select_facilities = self.wait_for(facilities)
+        select_type = self.wait_for((By.XPATH, CHROME_YEYAK_CONF['xpath.select_facility_type']))
+        options = self.extract_options(select_facilities)
+        if select_type.get_property('value') != facility_type:
+            self.action_select(select_type, facility_type)
+        elif options:  # Options of facility type are loaded already
+            return select_facilities
+        self.wait_options_change(facilities, options, timeout=FACILITY_LOAD_TIMEOUT)
+        return self.search_by_xpath(CHROME_YEYAK_CONF['xpath.select_facilities'])
+
+    def _register_facility(self, options, select_elem, quarter_start_times, username, facility_type=SOCCER_CODE):
+        """
+        Register the first facility of options having a time slot in quarter_start_times.
+        Options are evaluated in separate browsers at the same time if 'parallel.fan_out' is over 1.
+        """
+        if PARALLEL_FAN_OUT > 1 and len(options) > 1:
+            return self._register_parallel(options, facility_type, quarter_start_times, username)
 
-    def _register_facility(self, options, select_elem, quarter_start_times, username):
         # Check daily quarter(time area) matched by each option
-        for option in options:
-            # Select option and Go to reservation page (예약하기(1))
-            option_value, facility_name = option
-            self.action_select(select_elem, option_value)
-            self.click_elem(
-                self.search_by_xpath('/html/body/div/div[3]/div[1]/div[1]/div/div/div[2]/div[1]/button'))
+        for i, option in enumerate(options):
+            if i > 0:  # Page moved by the previous option
+                select_elem = self._select_facility_type(facility_type, reopen=True)
+            slot = self._find_slot(option, quarter_start_times, select_elem=select_elem)
+            if slot is not None:
+                with self.phase('submit'):
+                    return self._submit_slot(option[1], slot, username)
+        return None, None
 
-            # Clear all popup
-            for popup in self.search_many_by_class_name('pop_x'):
-                LOGGER.info(f'[YEYAK] Click existing popup')
+    def _register_parallel(self, options, facility_type, quarter_start_times, username):
+        """
+        Evaluate options in this and pooled browsers at the same time.
+        The first option in order having a slot is submitted, as soon as every option before it has none.
+        The others stop at once.
+        """
+        pool, helpers = get_yeyak_pool(), []
+        for _ in range(min(PARALLEL_FAN_OUT, len(options)) - 1):
+            try:
+                helpers.append(pool.acquire(timeout=0))
+            except HandlerPoolTimeoutError:
+                break
+        LOGGER.info(f'[YEYAK] Evaluate {len(options)} facilities in {len(helpers) + 1} browsers.')
+
+        unresolved = object()
+        pending = Queue()
+        for i, option in enumerate(options):
+            pending.put((i, option))
+        slots, decision, result = [unresolved] * len(options), [None], [(None, None)]
+        cond = threading.Condition()
+
+        def _decide():
+            for i, slot in enumerate(slots):
+                if slot is unresolved:
+                    return None
+                if slot is not None:
+                    return i
+            return -1  # No slot at all
+
+        def _work(handler: 'YeyakHandler'):
+            try:
+                _evaluate(handler)
+            finally:
+                if handler is not self and handler.trace is not None:
+                    handler.trace.finish()  # End phase of its branch
+
+        def _evaluate(handler: 'YeyakHandler'):
+            try:
+                if handler is not self:
+                    handler.test = self.test
+                    handler.start_session()
+            except Exception:
+                LOGGER.exception(f'[YEYAK] Failed to prepare browser for parallel evaluation')
+                return
+
+            while decision[0] is None:
                 try:
-                    self.click_elem(popup)
+                    i, option = pending.get_nowait()
+                except Empty:
+                    return
+                try:
+                    slot = handler._find_slot(option, quarter_start_times, facility_type=facility_type)
                 except Exception:
-                    LOGGER.error(f'[YEYAK] An error occurred clicking popup button')
-
-            # Go to detailed reservation page (예약하기(2))
-            self.click_elem(self.search_by_xpath(
-                '/html/body/div/div[3]/div[2]/div/form[2]/div[1]/div[2]/div/div/a[1]'))
-
-            # Select specific schedule matched (daily -> timely)
-            for daily_elem in self.search_many_by_class_name('tbl_cal .able'):
-                daily_elem_tag_a = self.search_by_tag_name('a', daily_elem)
-
-                # TODO: Move to datetimelib.py
-                KST_TZ = pytz.timezone('Asia/Seoul')
-                curr_datetime_kst = datetime.utcnow().replace(tzinfo=pytz.timezone('UTC')).astimezone(tz=KST_TZ)
+                    LOGGER.exception(f'[YEYAK] An error occurred evaluating {option[1]}')
+                    slot = None
+
+                with cond:
+                    slots[i] = slot
+                    if decision[0] is None:
+                        decision[0] = _decide()
+                        if decision[0] is not None:
+                            cond.notify_all()
+                    if slot is None:
+                        continue
+                    # Hold the slot until options before it are resolved
+                    while decision[0] is None:
+                        cond.wait()
+                    if decision[0] != i:
+                        return
+                with handler.phase('submit'):
+                    result[0] = handler._submit_slot(option[1], slot, username)
+                return
+
+        for i, helper in enumerate(helpers, start=1):  # Trace of a run is not shared by threads opening phases
+            helper.trace = self.trace.branch('helper', browser=i) if self.trace is not None else None
+        threads = [threading.Thread(target=_work, args=(handler,), daemon=True) for handler in [self, *helpers]]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            with cond:
+                if decision[0] is None:  # Every browser failed before resolving all options
+                    decision[0] = -1
+                    cond.notify_all()
+        finally:
+            for helper in helpers:  # Give back even if a thread failed to start
+                pool.release(helper)
+        return result[0]
+
+    def _find_slot(self, option, quarter_start_times, select_elem=None, facility_type=SOCCER_CODE) -> Optional[Tuple]:
+        """
+        Go to calendar of option and Click the first weekend time slot in quarter_start_times.
+        Return (selected_date_kst, start_hour, selected_weekday) of the clicked slot, None if there is none.
+
+        :param select_elem: facilities select element of the current page. If None, home page is reopened.
+        """
+        # Skip facility known to be full by a fresh snapshot
+        option_value, facility_name = option
+        if self._known_full(option_value, quarter_start_times):
+            LOGGER.info(f'[YEYAK] Skip {facility_name}, no matched time in snapshot.')
+            return None
+
+        # Select option and Go to reservation page (예약하기(1))
+        if select_elem is None:
+            select_elem = self._select_facility_type(facility_type, reopen=True)
+        self.action_select(select_elem, option_value)
+        self.click_elem(self.wait_clickable(BTN_YEYAK_MAIN))
+
+        # Clear all popup once the facility page is loaded, Popups cover the button otherwise
+        self.wait_for(BTN_YEYAK_DETAIL)
+        self.clear_popups()
+
+        # Go to detailed reservation page (예약하기(2))
+        self.click_elem(self.wait_clickable(BTN_YEYAK_DETAIL))
+
+        # Select specific schedule matched (daily -> timely)
+        try:
+            self.wait_for(CALENDAR_ABLE)
+        except TimeoutException:
+            LOGGER.info(f'[YEYAK] No available date of {facility_name}')
+            self.snapshot.save_calendar(option_value, {})
+            return None
+        daily_links = self.extract_links('.tbl_cal .able', 'data-ymd')
+        observed = {ymd: None for ymd, _ in daily_links}  # ymd -> start_hm of time slots opened
+
+        # TODO: Move to datetimelib.py
+        import pytz  # Imported on first use, apart from app startup
+        KST_TZ = pytz.timezone('Asia/Seoul')
+        curr_datetime_kst = datetime.utcnow().replace(tzinfo=pytz.timezone('UTC')).astimezone(tz=KST_TZ)
+        try:
+            for ymd, daily_elem_tag_a in daily_links:
                 selected_date_kst = KST_TZ.localize(  # Get selected date as KST
-                    datetime.strptime(daily_elem_tag_a.get_attribute('data-ymd'), '%Y%m%d'))
+                    datetime.strptime(ymd, '%Y%m%d'))
 
                 selected_weekday = selected_date_kst.weekday()
                 # Check weekends except today
-                if curr_datetime_kst.date() != selected_date_kst.date() and selected_weekday >= 5:
-                    self.click_elem(daily_elem_tag_a)
-                    for timely_elem in self.search_many_by_class_name('tab-all'):
-                        timely_elem_tag_a = self.search_by_tag_name('a', timely_elem)
-                        start_hour = int(timely_elem_tag_a.get_attribute('data-start-hm').split(':')[0])
-                        if selected_weekday == 6:  # Adjust start_hour for sunday
-                            start_hour += 18
-
-                        # Check for quarter time matched
-                        if start_hour in quarter_start_times:
-                            self.click_elem(timely_elem_tag_a)
-
-                            # Additioanl info
-                            group_name = 'FC Tesla'
-                            register_email_id = 'yyy123789'
-                            register_email_domain = 'naver.com'
-                            register_date = (selected_date_kst + timedelta(
-                                hours=start_hour - 18 if selected_weekday == 6 else start_hour
-                            )).strftime('%Y-%m-%d %H:%M:%S')
-
-                            LOGGER.info(f'[YEYAK] START-HOUR-MATCHED: '
-                                        f'{register_date} -> ({selected_weekday}){start_hour}')
-
-                            self.click_elem(self.search_by_class_name('user_plus'))  # 이용인원
-                            for e in self.search_many_by_class_name('book_tit2 label'):  # 신청자 정보와 동일, 전체동의
-                                try:
-                                    self.click_elem(e)
-                                except Exception:
-                                    LOGGER.error(f'[YEYAK] An error occurred clicking label for, '
-                                                 f'"chk_info", "chk_agree_all"')
-                            try:
-                                self.click_elem(
-                                    self.search_by_xpath('/html/body/div/div[3]/div[2]/div/div[1]/form/div[3]'
-                                                         '/div[2]/div[5]/table/tbody/tr[1]/td/span[2]/label')
-                                )  # Select radio label for '단체'
-                            except Exception:
-                                LOGGER.exception(f'There is no radio element for "단체"')
-                            self.send_keys_to_elem(self.search_by_id('grp_nm'), group_name)  # 단체명
-                            self.send_keys_to_elem(self.search_by_id('form_email1'), register_email_id)  # 이메일
-                            self.send_keys_to_elem(self.search_by_id('form_email2'), register_email_domain)
-
-                            # Yeyak for matched target if not in test mode!!
-                            if not self.test:
-                                self.click_elem(self.search_by_xpath(  # Click final yeyak button
-                                    '/html/body/div/div[3]/div[2]/div/div[1]/form/div[3]/div[3]/div/div[3]/button'))
-                                self.driver.switch_to.alert.accept()  # Pass existing alert
-
-                            self.sleep(3)
-
-                            # Return reservation message
-                            return f'{"[TEST] " if self.test else ""}예약 완료!', \
-                                   f'- 시설명: {facility_name}\n' \
-                                   f'- 일시: {register_date}\n' \
-                                   f'- 예약자명: {username}\n' \
-                                   f'- 예약 이메일: {register_email_id}@{register_email_domain}'
-        return None, None
+                if curr_datetime_kst.date() == selected_date_kst.date() or selected_weekday < 5:
+                    continue
+
+                # Wait until slots of the previous date are replaced, not to read them as slots of this date
+                previous_slots = self.find_present(TIME_SLOT)
+                self.click_elem(daily_elem_tag_a)
+                if previous_slots and not self.wait_staleness(previous_slots[0], timeout=SLOT_LOAD_TIMEOUT):
+                    continue
+                try:
+                    self.wait_for(TIME_SLOT, timeout=SLOT_LOAD_TIMEOUT)
+                except TimeoutException:
+                    continue
+                timely_links = self.extract_links('.tab-all', 'data-start-hm')
+                observed[ymd] = [start_hm for start_hm, _ in timely_links]
+                for start_hm, timely_elem_tag_a in timely_links:
+                    start_hour = adjust_start_hour(start_hm, selected_weekday)
+
+                    # Check for quarter time matched
+                    if start_hour in quarter_start_times:
+                        self.click_elem(timely_elem_tag_a)
+                        return selected_date_kst, start_hour, selected_weekday
+        finally:
+            self.snapshot.save_calendar(option_value, observed)
+        return None
+
+    def _submit_slot(self, facility_name: str, slot: Tuple, username: str) -> Tuple:
+        """Fill in additional info of the clicked slot, Submit it if not in test mode and Return message."""
+        selected_date_kst, start_hour, selected_weekday = slot
+
+        # Additioanl info
+        group_name = 'FC Tesla'
+        register_email_id = 'yyy123789'
+        register_email_domain = 'naver.com'
+        register_date = (selected_date_kst + timedelta(
+            hours=start_hour - 18 if selected_weekday == 6 else start_hour
+        )).strftime('%Y-%m-%d %H:%M:%S')
+
+        LOGGER.info(f'[YEYAK] START-HOUR-MATCHED: '
+                    f'{register_date} -> ({selected_weekday}){start_hour}')
+
+        self.click_elem(self.wait_clickable((By.CLASS_NAME, 'user_plus')))  # 이용인원
+        for e in self.wait_for(AGREE_LABELS, condition='presence_all'):  # 신청자 정보와 동일, 전체동의
+            try:
+                self.click_elem(e)
+            except Exception:
+                LOGGER.error(f'[YEYAK] An error occurred clicking label for, '
+                             f'"chk_info", "chk_agree_all"')
+        group_labels = self.find_present(LABEL_GROUP)
+        if group_labels:
+            self.click_elem(group_labels[0])  # Select radio label for '단체'
+        else:
+            LOGGER.info(f'There is no radio element for "단체"')
+        self.send_keys_to_elem(self.wait_for((By.ID, 'grp_nm'), condition='visibility'), group_name)  # 단체명
+        self.send_keys_to_elem(self.wait_for((By.ID, 'form_email1')), register_email_id)  # 이메일
+        self.send_keys_to_elem(self.wait_for((By.ID, 'form_email2')), register_email_domain)
+
+        # Yeyak for matched target if not in test mode!!
+        if not self.test:
+            page = self.search_by_tag_name('html')
+            self.click_elem(self.wait_clickable(BTN_YEYAK_SUBMIT))  # Click final yeyak button
+            self.wait_alert().accept()  # Pass existing alert
+            self.wait_staleness(page)  # Wait until registration page is submitted
+
+        # Return reservation message
+        return f'{"[TEST] " if self.test else ""}예약 완료!', \
+               f'- 시설명: {facility_name}\n' \
+               f'- 일시: {register_date}\n' \
+               f'- 예약자명: {username}\n' \
+               f'- 예약 이메일: {register_email_id}@{register_email_domain}'
+
+    def _known_full(self, option_value: str, quarter_start_times: Tuple) -> bool:
+        """Whether a snapshot younger than SNAPSHOT_SKIP_AGE shows no weekend time slot in quarter, except today."""
+        if not SNAPSHOT_SKIP_AGE:
+            return False
+        calendar = self.snapshot.load_calendar(option_value)
+        if calendar is None or datetime.now().timestamp() - calendar[0] > SNAPSHOT_SKIP_AGE:
+            return False
+
+        today_kst = kst_datetime().strftime('%Y%m%d')
+        for ymd, start_hms in calendar[1].items():
+            weekday = datetime.strptime(ymd, '%Y%m%d').weekday()
+            if ymd == today_kst or weekday < 5:  # Same as dates checked by _find_slot
+                continue
+            if start_hms is None:  # Time slots not observed
+                return False
+            if any(adjust_start_hour(start_hm, weekday) in quarter_start_times for start_hm in start_hms):
+                return False
+        return True
+
+
+def get_yeyak_pool() -> SeleniumHandlerPool:
+    """Return process-wide pool of YeyakHandler, created on first call."""
+    global _YEYAK_POOL
+    if _YEYAK_POOL is None:
+        _YEYAK_POOL = SeleniumHandlerPool(
+            factory=YeyakHandler,
+            min_size=POOL_CONF.get('pool.min_size') or 1,
+            max_size=POOL_CONF.get('pool.max_size') or 2,
+            max_uses=POOL_CONF.get('pool.max_uses') or 20,
+            max_memory_mb=POOL_CONF.get('pool.max_memory_mb'),
+            checkout_timeout=POOL_CONF.get('pool.checkout_timeout') or 300,
+        )
+        pool = _YEYAK_POOL
+        BROWSERS.set_function(lambda: pool.size - pool.idle_count, state='active')
+        BROWSERS.set_function(lambda: pool.idle_count, state='idle')
+    return _YEYAK_POOL
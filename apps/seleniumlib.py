@@ -3,24 +3,90 @@ Namu's custom selenium library classes.
 MAINTAINER: Ra Daesung (daesungra@gmail.com)
 """
 
+import os
+import json
+import inspect
 import logging
 import functools
-from typing import Union, Optional, Type
-from time import sleep
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Union, Optional, Type, Callable, List, Tuple
+from time import sleep, monotonic
 
 from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver import Firefox, FirefoxOptions, Chrome, ChromeOptions
-from selenium.common.exceptions import WebDriverException, UnexpectedAlertPresentException
+from selenium.common.exceptions import WebDriverException, UnexpectedAlertPresentException, TimeoutException
 
-from selenium.webdriver.support.ui import Select
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import Select, WebDriverWait
 
+from apps.tracing import Trace, NULL_SPAN
 from config import CONFIG
 
 
 LOGGER = logging.getLogger(__name__)
-CHROME_DRIVER_PATH = CONFIG['VAL']['selenium']['path.chromedriver']
-GECKO_DRIVER_PATH = CONFIG['VAL']['selenium']['path.geckodriver']
+SELENIUM_CONF = CONFIG['VAL']['selenium']
+CHROME_DRIVER_PATH = SELENIUM_CONF['path.chromedriver']
+GECKO_DRIVER_PATH = SELENIUM_CONF['path.geckodriver']
+IMPLICIT_WAIT = SELENIUM_CONF.get('wait.implicit') or 0
+WAIT_TIMEOUT = SELENIUM_CONF.get('wait.timeout') or 10
+WAIT_POLL_FREQUENCY = SELENIUM_CONF.get('wait.poll_frequency') or 0.2
+TRACE_ENABLED = bool(SELENIUM_CONF.get('trace.enabled'))  # Record spans of webdriver calls per run
+TRACE_DIR = SELENIUM_CONF.get('trace.dir') or Path(__file__).resolve().parent.parent / 'logs' / 'traces'
+
+# Locator is a tuple of (By.*, value), e.g. (By.XPATH, '//button')
+Locator = Tuple[str, str]
+WAIT_CONDITIONS = {
+    'presence': EC.presence_of_element_located,
+    'presence_all': EC.presence_of_all_elements_located,
+    'visibility': EC.visibility_of_element_located,
+    'clickable': EC.element_to_be_clickable,
+}
+
+
+# Bulk extraction scripts. Each of them costs a single webdriver round trip.
+EXTRACT_OPTIONS_SCRIPT = '''
+return Array.prototype.map.call(arguments[0].options, function (o) { return [o.value, o.text.trim()]; });
+'''
+EXTRACT_LINKS_SCRIPT = '''
+var selector = arguments[0], attribute = arguments[1], root = arguments[2] || document, links = [];
+root.querySelectorAll(selector).forEach(function (e) {
+    var a = e.querySelector('a');
+    if (a) { links.push([a.getAttribute(attribute), a]); }
+});
+return links;
+'''
+
+
+def process_tree_rss_mb(pid: int) -> Optional[float]:
+    """
+    Return resident memory of pid and all its descendants in MB, read from /proc.
+    Pages shared by the processes are counted for each of them. None where /proc is not available.
+    """
+    proc = Path('/proc')
+    if not proc.is_dir():
+        return None
+
+    children = {}  # ppid -> pids
+    for stat in proc.glob('[0-9]*/stat'):
+        try:
+            ppid = int(stat.read_text().rsplit(')', 1)[1].split()[1])  # Command name may contain spaces
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(stat.parent.name))
+
+    resident_pages, pids = 0, [pid]
+    while pids:
+        pid = pids.pop()
+        pids.extend(children.get(pid, []))
+        try:
+            resident_pages += int((proc / str(pid) / 'statm').read_text().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue  # Exited meanwhile
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
 
 
 class WebDriverPathError(WebDriverException):
@@ -44,28 +110,50 @@ class ChromeDriverNotFoundError(WebDriverNotFoundError):
     driver_type = 'Chrome'
 
 
+class HandlerPoolTimeoutError(WebDriverException):
+    def __init__(self, timeout: float):
+        super().__init__(msg=f'No idle webdriver handler in pool within {timeout} seconds.')
+
+
+def deco_nav_action(func):
+    """Decorate selenium navigation action, traced with its first argument as locator"""
+    @functools.wraps(func)
+    def _wrapper(self: 'SeleniumHandler', *args, **kwargs):
+        if self.trace is None:
+            return func(self, *args, **kwargs)
+        attrs = {'locator': str(args[0])} if args and isinstance(args[0], (str, tuple)) else {}
+        with self.trace.span(func.__name__, **attrs):
+            return func(self, *args, **kwargs)
+    return _wrapper
+
+
 class SeleniumHandler:
     driver: Optional[RemoteWebDriver] = None
     driver_not_found_error: Type[WebDriverNotFoundError] = WebDriverNotFoundError
     url: Optional[str] = None
+    trace: Optional[Trace] = None
 
     def __init__(self,
                  driver: RemoteWebDriver,
                  driver_not_found_error: Type[WebDriverNotFoundError] = WebDriverNotFoundError,
-                 url: str = None):
+                 url: str = None,
+                 implicit_wait: Union[int, float] = IMPLICIT_WAIT):
         """
         This is default handler for selenium webdriver.
         This can be inherited according to the browser type.
 
         :param driver:
             RemoteWebDriver type object for the specific browser specified in subclass.
+        :param implicit_wait:
+            Global implicit wait of driver. default is 0, use wait_* methods for elements loaded late.
 
         TODO: self.url must be set as the default web domain in the subclass or instance.
         """
         assert driver is not None
 
-        driver.implicitly_wait(time_to_wait=5)
+        driver.implicitly_wait(time_to_wait=implicit_wait)
         self.driver = driver
+        self.implicit_wait = implicit_wait
 
         if driver_not_found_error:
             self.driver_not_found_error = driver_not_found_error
@@ -85,6 +173,7 @@ class SeleniumHandler:
 
         self._test = test
 
+    @deco_nav_action
     def open(self, url: str = None):
         """Open web browser using self.driver and open_url."""
         if self.driver is None or not isinstance(self.driver, RemoteWebDriver):
@@ -97,6 +186,7 @@ class SeleniumHandler:
         self.driver.get(open_url)
         LOGGER.info(f'URL opened by webdriver.')
 
+    @deco_nav_action
     def quit(self):
         """Close opened web browser."""
         if self.driver is not None and isinstance(self.driver, RemoteWebDriver) and self.driver.current_url:
@@ -104,6 +194,7 @@ class SeleniumHandler:
             self.driver.quit()
             LOGGER.info(f"Webdriver is closed. current_url is '{curr_url}'")
 
+    @deco_nav_action
     def sleep(self, sec: Union[int, float] = 1):
         """
         Interval sleep by sec
@@ -112,9 +203,170 @@ class SeleniumHandler:
         """
         sleep(sec)
 
+    @deco_nav_action
     def refresh(self):
         self.driver.refresh()
 
+    def is_alive(self) -> bool:
+        """Check whether the browser behind self.driver still answers."""
+        if self.driver is None:
+            return False
+        try:
+            self.driver.execute_script('return 1;')
+        except WebDriverException:
+            return False
+        return True
+
+    def memory_usage_mb(self) -> Optional[float]:
+        """
+        Return resident memory of the driver service and the browser processes it started in MB,
+        e.g. chromedriver, chrome and its renderers. None if it is not measurable.
+        """
+        try:
+            pid = self.driver.service.process.pid
+        except AttributeError:  # Remote driver
+            return None
+        return process_tree_rss_mb(pid)
+
+    def reset(self):
+        """Clear per-job state before the handler goes back to a pool."""
+        self._test = False
+        self.trace = None
+
+    def start_trace(self, **attrs) -> Optional[Trace]:
+        """Trace webdriver calls of this handler until finish_trace(), if 'trace.enabled'."""
+        self.trace = Trace(**attrs) if TRACE_ENABLED else None
+        return self.trace
+
+    def finish_trace(self) -> Optional[Path]:
+        """Export trace as json into 'trace.dir', Log its per-phase summary and Return the file path."""
+        trace, self.trace = self.trace, None
+        if trace is None:
+            return None
+        trace.finish()
+        try:
+            path = trace.export(TRACE_DIR)
+        except OSError as e:
+            LOGGER.error(f'[TRACE] Failed to export trace {trace.id}. > {e}')
+            path = None
+        LOGGER.info(f'[TRACE] {path}\n{trace.format_summary()}')
+        return path
+
+    def phase(self, name: str, **attrs):
+        """Context grouping webdriver calls of a phase in trace. Nothing is recorded without trace."""
+        return self.trace.phase(name, **attrs) if self.trace is not None else NULL_SPAN
+
+    @deco_nav_action
+    def wait_for(self, locator: Locator, condition: str = 'presence', timeout: Union[int, float] = None):
+        """
+        Wait until condition of locator is satisfied and Return its result.
+
+        :param locator: tuple of (By.*, value).
+        :param condition: one of WAIT_CONDITIONS, 'presence', 'presence_all', 'visibility' or 'clickable'.
+        :param timeout: seconds to wait. default is WAIT_TIMEOUT.
+        :raise TimeoutException: condition is not satisfied within timeout.
+        """
+        return self._wait(timeout).until(
+            WAIT_CONDITIONS[condition](locator),
+            message=f'{condition} of {locator} not satisfied.',
+        )
+
+    def wait_clickable(self, locator: Locator, timeout: Union[int, float] = None) -> WebElement:
+        return self.wait_for(locator, condition='clickable', timeout=timeout)
+
+    @deco_nav_action
+    def wait_staleness(self, elem: WebElement, timeout: Union[int, float] = None) -> bool:
+        """Wait until elem is detached from the page, e.g. page reloaded. Return False on timeout."""
+        try:
+            return self._wait(timeout).until(EC.staleness_of(elem))
+        except TimeoutException:
+            return False
+
+    @deco_nav_action
+    def wait_options_change(self, locator: Locator, options: List[Tuple[str, str]],
+                            timeout: Union[int, float] = None) -> List[Tuple[str, str]]:
+        """
+        Wait until (value, text) of <option> in select element of locator differ from options.
+        Return the last options, which equal options on timeout.
+        """
+        last_options = [options]
+
+        def _changed(driver) -> bool:
+            try:
+                elem = driver.find_element(*locator)
+                last_options[0] = [tuple(o) for o in driver.execute_script(EXTRACT_OPTIONS_SCRIPT, elem)]
+            except WebDriverException:
+                return False
+            return last_options[0] != options
+
+        try:
+            self._wait(timeout).until(_changed)
+        except TimeoutException:
+            pass
+        return last_options[0]
+
+    @deco_nav_action
+    def wait_alert(self, timeout: Union[int, float] = None):
+        """Wait until alert is shown and Return it."""
+        return self._wait(timeout).until(EC.alert_is_present(), message='Alert not shown.')
+
+    @deco_nav_action
+    def find_present(self, locator: Locator) -> List[WebElement]:
+        """Return elements of locator existing right now, without any implicit wait."""
+        if not self.implicit_wait:
+            return self.driver.find_elements(*locator)
+        self.driver.implicitly_wait(time_to_wait=0)
+        try:
+            return self.driver.find_elements(*locator)
+        finally:
+            self.driver.implicitly_wait(time_to_wait=self.implicit_wait)
+
+    def is_present(self, locator: Locator) -> bool:
+        """Fast probe whether locator exists right now."""
+        return bool(self.find_present(locator))
+
+    @contextmanager
+    def implicitly_waiting(self, seconds: Union[int, float]):
+        """Set implicit wait of driver for the with-block, e.g. legacy flows searching elements without wait_*."""
+        previous = self.implicit_wait
+        self.driver.implicitly_wait(time_to_wait=seconds)
+        self.implicit_wait = seconds
+        try:
+            yield
+        finally:
+            self.implicit_wait = previous
+            self.driver.implicitly_wait(time_to_wait=previous)
+
+    def _wait(self, timeout: Union[int, float] = None) -> WebDriverWait:
+        return WebDriverWait(
+            self.driver,
+            timeout=WAIT_TIMEOUT if timeout is None else timeout,
+            poll_frequency=WAIT_POLL_FREQUENCY,
+        )
+
+    def execute_script(self, script: str, *args):
+        """Run javascript in current page and Return its result in a single webdriver round trip."""
+        if self.driver is None or not isinstance(self.driver, RemoteWebDriver):
+            raise self.driver_not_found_error
+        return self.driver.execute_script(script, *args)
+
+    @deco_nav_action
+    def extract_options(self, select_elem: WebElement) -> List[Tuple[str, str]]:
+        """Return (value, text) of every <option> in select_elem at once."""
+        return [tuple(option) for option in self.execute_script(EXTRACT_OPTIONS_SCRIPT, select_elem)]
+
+    @deco_nav_action
+    def extract_links(self, css_selector: str, attribute: str, elem: WebElement = None) -> List[Tuple[str, WebElement]]:
+        """
+        Return (attribute value, <a> element) of the first anchor of every element matched by css_selector at once.
+        Elements without anchor are skipped. The element can be clicked without searching it again.
+
+        :param css_selector: css selector of container elements, e.g. '.tbl_cal .able'.
+        :param attribute: attribute name read from the anchor, e.g. 'data-ymd'.
+        :param elem: search inside elem instead of the whole document.
+        """
+        return [tuple(link) for link in self.execute_script(EXTRACT_LINKS_SCRIPT, css_selector, attribute, elem)]
+
     def search_by_class_name(self, class_name: str, elem: WebElement = None): pass
 
     def search_many_by_class_name(self, class_name: str, elem: WebElement = None): pass
@@ -134,13 +386,34 @@ class SeleniumHandler:
     def action_select(self, elem: WebElement, code: str): pass
 
 
+def deco_implicit_wait(seconds: Union[int, float]):
+    """Decorate handler method or generator searching elements without wait_*, to run with implicit wait."""
+    def _decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def _generator_wrapper(self: SeleniumHandler, *args, **kwargs):
+                with self.implicitly_waiting(seconds):
+                    yield from func(self, *args, **kwargs)
+            return _generator_wrapper
+
+        @functools.wraps(func)
+        def _wrapper(self: SeleniumHandler, *args, **kwargs):
+            with self.implicitly_waiting(seconds):
+                return func(self, *args, **kwargs)
+        return _wrapper
+    return _decorator
+
+
 def deco_search_action(func):
     """Decorate selenium action"""
     @functools.wraps(func)
     def _wrapper(self: SeleniumHandler, search_key: str, elem: WebElement = None, *args, **kwargs):
         # TODO: Add more necessary pre_process
         assert search_key is not None and isinstance(search_key, str)
-        return func(self, search_key, elem, *args, **kwargs)
+        if self.trace is None:
+            return func(self, search_key, elem, *args, **kwargs)
+        with self.trace.span(func.__name__, locator=search_key):
+            return func(self, search_key, elem, *args, **kwargs)
     return _wrapper
 
 
@@ -150,28 +423,177 @@ def deco_elem_action(func):
     def _wrapper(self: SeleniumHandler, elem: WebElement, *args, **kwargs):
         # TODO: Add more necessary pre_process
         assert elem is not None and isinstance(elem, WebElement)
-        try:
-            return func(self, elem, *args, **kwargs)
-        except UnexpectedAlertPresentException as uae:
-            LOGGER.exception(f'Unexpected Alert Error occurred: {uae}')
-            self.driver.switch_to.alert.accept()
-            # Try again after alert clear
-            return func(self, elem, *args, **kwargs)
+        with self.trace.span(func.__name__, element=elem.id) if self.trace is not None else NULL_SPAN:
+            try:
+                return func(self, elem, *args, **kwargs)
+            except UnexpectedAlertPresentException as uae:
+                LOGGER.exception(f'Unexpected Alert Error occurred: {uae}')
+                self.driver.switch_to.alert.accept()
+                # Try again after alert clear
+                return func(self, elem, *args, **kwargs)
     return _wrapper
 
 
+class BrowserProfile:
+    # Url patterns by file extension blocked for each resource type, through Network.setBlockedURLs.
+    # Resources served without the extension are not blocked. Fetch.enable can match resource types,
+    # but every paused request must then be answered from devtools events, which selenium 3 cannot listen to.
+    # Images are also blocked by chrome content settings, regardless of url.
+    RESOURCE_TYPE_PATTERNS = {
+        'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp'],
+        'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+        'stylesheet': ['*.css'],
+        'media': ['*.mp4', '*.webm', '*.mp3', '*.ogg'],
+    }
+    LOW_MEMORY_ARGUMENTS = [
+        '--disable-dev-shm-usage',
+        '--disable-extensions',
+        '--disable-background-networking',
+        '--disable-renderer-backgrounding',
+        '--renderer-process-limit=2',
+        '--js-flags=--max-old-space-size=256',
+    ]
+
+    def __init__(self,
+                 page_load_strategy: str = 'normal',
+                 block_resource_types: List[str] = None,
+                 block_url_patterns: List[str] = None,
+                 low_memory: bool = False,
+                 collect_network_stats: bool = False):
+        """
+        Chrome launch profile.
+
+        :param page_load_strategy: 'normal', 'eager' (until DOMContentLoaded) or 'none'.
+        :param block_resource_types: keys of RESOURCE_TYPE_PATTERNS to block, e.g. ['image', 'font'].
+        :param block_url_patterns: additional url patterns to block, e.g. ['*google-analytics.com*'].
+        :param low_memory: add LOW_MEMORY_ARGUMENTS.
+        :param collect_network_stats: record devtools network events to report requests and bytes.
+        """
+        assert page_load_strategy in ('normal', 'eager', 'none')
+
+        self.page_load_strategy = page_load_strategy
+        self.block_resource_types = block_resource_types or []
+        self.block_url_patterns = block_url_patterns or []
+        self.low_memory = low_memory
+        self.collect_network_stats = collect_network_stats
+
+    @classmethod
+    def from_config(cls, conf: dict = SELENIUM_CONF) -> 'BrowserProfile':
+        return cls(
+            page_load_strategy=conf.get('profile.page_load_strategy') or 'normal',
+            block_resource_types=conf.get('profile.block_resource_types'),
+            block_url_patterns=conf.get('profile.block_url_patterns'),
+            low_memory=bool(conf.get('profile.low_memory')),
+            collect_network_stats=bool(conf.get('profile.network_stats')),
+        )
+
+    @property
+    def blocked_urls(self) -> List[str]:
+        urls = list(self.block_url_patterns)
+        for resource_type in self.block_resource_types:
+            urls.extend(self.RESOURCE_TYPE_PATTERNS[resource_type])
+        return urls
+
+    def chrome_options(self) -> ChromeOptions:
+        options = ChromeOptions()
+        # options.add_argument('window-size=1600,1024')
+        options.add_argument('--headless')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--no-proxy-server')
+        # options.add_argument('--no-sandbox')
+        if self.low_memory:
+            for argument in self.LOW_MEMORY_ARGUMENTS:
+                options.add_argument(argument)
+        if 'image' in self.block_resource_types:
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        return options
+
+    def capabilities(self, options: ChromeOptions) -> dict:
+        capabilities = options.to_capabilities()
+        capabilities['pageLoadStrategy'] = self.page_load_strategy
+        if self.collect_network_stats:
+            capabilities['goog:loggingPrefs'] = {'performance': 'ALL'}
+        return capabilities
+
+    def apply(self, driver: Chrome):
+        """Block urls through devtools of a started driver."""
+        blocked_urls = self.blocked_urls
+        if blocked_urls:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_urls})
+
+
+class NetworkStats:
+    def __init__(self):
+        """
+        Requests and bytes aggregated from devtools performance log.
+        Blocked requests have no size, so bytes_saved is estimated
+        by the average size of the same resource type loaded in this run.
+        """
+        self.requests = 0
+        self.requests_blocked = 0
+        self.bytes_loaded = 0
+        self._types = {}  # requestId -> resource type
+        self._loaded = {}  # resource type -> [count, bytes]
+        self._blocked = {}  # resource type -> count
+
+    def feed(self, entries: List[dict]):
+        for entry in entries:
+            message = json.loads(entry['message'])['message']
+            method, params = message.get('method'), message.get('params', {})
+            if method == 'Network.requestWillBeSent':
+                self.requests += 1
+                self._types[params['requestId']] = params.get('type', 'Other')
+            elif method == 'Network.loadingFinished':
+                size = int(params.get('encodedDataLength', 0))
+                self.bytes_loaded += size
+                loaded = self._loaded.setdefault(self._types.pop(params['requestId'], 'Other'), [0, 0])
+                loaded[0] += 1
+                loaded[1] += size
+            elif method == 'Network.loadingFailed' and params.get('blockedReason'):
+                self.requests_blocked += 1
+                resource_type = self._types.pop(params['requestId'], 'Other')
+                self._blocked[resource_type] = self._blocked.get(resource_type, 0) + 1
+
+    @property
+    def bytes_saved(self) -> int:
+        saved = 0
+        for resource_type, count in self._blocked.items():
+            loaded_count, loaded_bytes = self._loaded.get(resource_type, (0, 0))
+            if loaded_count:
+                saved += count * loaded_bytes // loaded_count
+        return saved
+
+    def to_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'requests_blocked': self.requests_blocked,
+            'bytes_loaded': self.bytes_loaded,
+            'bytes_saved': self.bytes_saved,
+            'blocked_by_type': dict(self._blocked),
+        }
+
+
 class ChromeDriverHandler(SeleniumHandler):
-    def __init__(self, url: str = None):
-        """Set and Handling Chrome webdriver."""
+    def __init__(self, url: str = None, profile: BrowserProfile = None):
+        """
+        Set and Handling Chrome webdriver.
+
+        :param profile: launch profile of chrome. default is built from 'profile.*' of selenium config.
+        """
+        self.profile = profile or BrowserProfile.from_config()
         try:
-            options = ChromeOptions()
-            # options.add_argument('window-size=1600,1024')
-            options.add_argument('--headless')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--no-proxy-server')
-            # options.add_argument('--no-sandbox')
-            # options.add_argument('--disable-dev-shm-usage')
-            driver = Chrome(executable_path=CHROME_DRIVER_PATH, options=options)
+            options = self.profile.chrome_options()
+            driver = Chrome(
+                executable_path=CHROME_DRIVER_PATH,
+                options=options,
+                desired_capabilities=self.profile.capabilities(options),
+            )
+            try:
+                self.profile.apply(driver)
+            except Exception:
+                driver.quit()  # Do not leak the browser just started
+                raise
         except WebDriverException as we:
             raise WebDriverException(
                 msg=f"An error occurred. webdriver path is '{CHROME_DRIVER_PATH}'",
@@ -179,6 +601,26 @@ class ChromeDriverHandler(SeleniumHandler):
             )
 
         super().__init__(driver=driver, driver_not_found_error=ChromeDriverNotFoundError, url=url)
+        self._network_stats = NetworkStats()
+
+    def network_stats(self) -> Optional[dict]:
+        """Return requests and bytes of this run, None if profile does not collect them."""
+        if not self.profile.collect_network_stats:
+            return None
+        try:
+            self._network_stats.feed(self.driver.get_log('performance'))
+        except WebDriverException as we:
+            LOGGER.error(f'Failed to read performance log. > {we}')
+        return self._network_stats.to_dict()
+
+    def reset(self):
+        super().reset()
+        if self.profile.collect_network_stats:
+            try:
+                self.driver.get_log('performance')  # Drain events of the previous run
+            except WebDriverException:
+                pass
+            self._network_stats = NetworkStats()
 
     @deco_search_action
     def search_by_class_name(self, class_name: str, elem: WebElement = None):
@@ -227,3 +669,166 @@ class ChromeDriverHandler(SeleniumHandler):
     @deco_elem_action
     def action_select(self, elem: WebElement, code: str):
         Select(elem).select_by_value(code)
+
+
+class SeleniumHandlerPool:
+    def __init__(self,
+                 factory: Callable[[], SeleniumHandler],
+                 min_size: int = 1,
+                 max_size: int = 2,
+                 max_uses: int = 20,
+                 max_memory_mb: Optional[float] = None,
+                 checkout_timeout: float = 300):
+        """
+        Pool of pre-started SeleniumHandler instances.
+        Jobs check a handler out and give it back instead of starting a new browser every time.
+
+        :param factory: callable creating a new started handler, e.g. YeyakHandler.
+        :param min_size: number of browsers kept warm by warm_up().
+        :param max_size: hard limit of browsers alive at the same time.
+        :param max_uses: a browser is recycled after this many checkouts.
+        :param max_memory_mb: a browser is recycled when resident memory of its processes is over this size.
+        :param checkout_timeout: seconds to wait for an idle handler before HandlerPoolTimeoutError.
+        """
+        assert 0 <= min_size <= max_size and max_size > 0
+
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self.checkout_timeout = checkout_timeout
+
+        self._idle: List[SeleniumHandler] = []
+        self._uses = {}  # id(handler) -> checkout count
+        self._size = 0  # idle + checked out + starting
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    def warm_up(self):
+        """Start browsers until min_size handlers are alive."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                handler = self._create()
+            except Exception:
+                return
+            with self._cond:
+                self._idle.append(handler)
+                self._cond.notify()
+
+    def acquire(self, timeout: float = None) -> SeleniumHandler:
+        """
+        Check out a healthy handler, starting a new browser if the pool is not full.
+
+        :param timeout: seconds to wait for an idle handler. default is checkout_timeout.
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = monotonic() + timeout
+        while True:
+            create = False
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        raise HandlerPoolTimeoutError(timeout)
+                    self._cond.wait(timeout=remaining)
+                if self._idle:
+                    handler = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+
+            if create:
+                handler = self._create()
+            elif not handler.is_alive():
+                LOGGER.warning(f'[POOL] Dead webdriver found. replace it.')
+                self._discard(handler)
+                continue
+
+            with self._cond:
+                self._uses[id(handler)] = self._uses.get(id(handler), 0) + 1
+            return handler
+
+    def release(self, handler: SeleniumHandler):
+        """Give back a handler. Worn out, dead or broken browsers are quit instead of kept."""
+        with self._cond:
+            uses = self._uses.get(id(handler), 0)
+        if self._closed:
+            self._discard(handler)
+            return
+        if uses >= self.max_uses:
+            LOGGER.info(f'[POOL] Recycle webdriver after {uses} uses.')
+            self._discard(handler)
+            return
+        if not handler.is_alive():
+            LOGGER.warning(f'[POOL] Returned webdriver is dead. discard it.')
+            self._discard(handler)
+            return
+        try:
+            if self.max_memory_mb is not None:
+                memory = handler.memory_usage_mb()
+                if memory is not None and memory > self.max_memory_mb:
+                    LOGGER.info(f'[POOL] Recycle webdriver using {memory:.1f}MB.')
+                    self._discard(handler)
+                    return
+            handler.reset()
+        except Exception:
+            LOGGER.exception(f'[POOL] Failed to reset returned webdriver. discard it.')
+            self._discard(handler)
+            return
+
+        with self._cond:
+            self._idle.append(handler)
+            self._cond.notify()
+
+    @contextmanager
+    def handler(self):
+        """Check out a handler for the with-block and return it afterwards."""
+        handler = self.acquire()
+        try:
+            yield handler
+        finally:
+            self.release(handler)
+
+    def close(self):
+        """Quit every idle browser. Checked out handlers are quit when released."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._closed = True
+        for handler in idle:
+            self._discard(handler)
+
+    def _create(self) -> SeleniumHandler:
+        try:
+            handler = self.factory()
+        except Exception as e:  # e.g. WebDriverException, or OSError of missing chromedriver
+            LOGGER.exception(f'[POOL] Failed to start webdriver: {e}')
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        LOGGER.info(f'[POOL] Webdriver started. pool size is {self._size}')
+        return handler
+
+    def _discard(self, handler: SeleniumHandler):
+        with self._cond:
+            self._uses.pop(id(handler), None)
+        try:
+            handler.driver.quit()
+        except Exception:
+            LOGGER.exception(f'[POOL] An error occurred quitting webdriver')
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
@@ -1,9 +1,13 @@
 """
 WSGI entrypoint.
+Standard library is patched for gevent workers before anything else is imported.
 MAINTAINER: Ra Daesung (daesungra@gmail.com)
 """
 
-from apps import create_app
+from gevent import monkey
+monkey.patch_all()
 
+from apps import create_app  # noqa: E402
 
-app = create_app()
+
+app = create_app(warm_up=False)  # Preloaded by gunicorn master, browsers are warmed up in each worker by post_fork
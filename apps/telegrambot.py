@@ -1,9 +1,8 @@
 import logging
-import requests
 from abc import ABCMeta, abstractmethod
 from typing import Union, Optional, Dict, List
-from requests.exceptions import HTTPError, ConnectionError
 
+from apps.telegramlib import TelegramSender, ProgressReporter, get_sender
 from apps.reservation.db.redis.chat_session import ChatSession
 
 
@@ -66,13 +65,8 @@ class TelegramBot(metaclass=ABCMeta):
             )
 
     def _touch_or_create_session(self):
-        """Touch or Create redis session"""
-        session = ChatSession(self.chat_id)
-        if not session.exists():
-            session.username = self.username
-            session.commit()
-        session.touch()
-        self.chat_session = session
+        """Touch or Create redis session in a single round trip"""
+        self.chat_session = ChatSession.load_or_create(self.chat_id, self.username)
 
     def _update_session(self, **kwargs):
         """Update redis session with new values"""
@@ -92,8 +86,23 @@ class TelegramBot(metaclass=ABCMeta):
             self.response_title = resp_title
         self.response_body = resp_body  # It can be None
 
-    def send_response(self) -> bool:
-        """Send message to telegram bot."""
+    @property
+    def sender(self) -> TelegramSender:
+        assert self.webhook_domain is not None
+        return get_sender(self.webhook_domain)
+
+    def progress_reporter(self, min_interval: float = 3) -> ProgressReporter:
+        """Return reporter showing progress of a long command as a single message edited in place."""
+        assert self.chat_id is not None
+        return ProgressReporter(self.sender, self.chat_id, min_interval=min_interval)
+
+    def send_response(self, wait: bool = False) -> bool:
+        """
+        Send message to telegram bot.
+        The message is queued to the background sender and this returns at once, unless wait is set.
+
+        :param wait: block until telegram answers, and Return whether it is sent.
+        """
         assert self.webhook_domain is not None
         assert self.chat_id is not None
         assert self.response_title is not None
@@ -102,32 +111,23 @@ class TelegramBot(metaclass=ABCMeta):
         if self.response_body:
             response = f'{response}\n\n{self.response_body}'
 
-        result = False
-        if self.bot_status >= 2:
-            try:
-                send_result = requests.post(
-                    f'{self.webhook_domain}/sendMessage',
-                    json={
-                        'chat_id': self.chat_id,
-                        'text': response,
-                    }
-                )
-                send_result.raise_for_status()
-            except (HTTPError, ConnectionError) as e:
-                LOGGER.error(f'Error occurred while sending message response. > {e}')
-                return False
-
-            result_json = send_result.json()
-            LOGGER.info(f"> [{self.username}][{result_json['ok']}] "
-                        f"title: {self.response_title}, body: {self.response_body}")
-            result = bool(result_json['ok'])
-        else:
+        if self.bot_status < 2:
             LOGGER.warning(f'Message not sent. bot_status: {self.bot_status}')
-
-        # Clear responses already sent
-        if result:
-            self.response_title, self.response_body = None, None
-        return result
+            return False
+
+        future = self.sender.send_message(self.chat_id, response)
+        LOGGER.info(f"> [{self.username}] title: {self.response_title}, body: {self.response_body}")
+
+        # Clear responses already queued
+        self.response_title, self.response_body = None, None
+        if not wait:
+            return True
+        try:
+            future.result(timeout=self.sender.timeout * (self.sender.max_retries + 1))
+        except Exception as e:
+            LOGGER.error(f'Error occurred while sending message response. > {e}')
+            return False
+        return True
 
     @abstractmethod
     def _make_contents(self, command: str, *args): pass
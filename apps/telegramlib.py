@@ -0,0 +1,388 @@
+"""
+Namu's custom telegram bot api library classes.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import heapq
+import logging
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+from time import sleep, monotonic
+from typing import Deque, Dict, Optional, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from apps.metrics import TELEGRAM_SEND_LATENCY, TELEGRAM_SEND_ERRORS
+from config import CONFIG
+
+
+LOGGER = logging.getLogger(__name__)
+RESERV_CONF = CONFIG['APPS']['reservation']
+BUCKET_SWEEP_INTERVAL = 60  # seconds between evictions of rate limit state of idle chats
+
+_SENDERS: Dict[str, 'TelegramSender'] = {}
+_SENDERS_LOCK = threading.Lock()
+
+
+class TelegramApiError(Exception):
+    def __init__(self, method: str, description: str):
+        super().__init__(f'{method} failed. > {description}')
+        self.method = method
+        self.description = description
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        """
+        Token bucket rate limiter.
+
+        :param rate: tokens refilled per second.
+        :param capacity: max tokens stored, which is the allowed burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self) -> float:
+        """Take a token. Return 0 if taken, or seconds to wait for the next token."""
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is taken."""
+        wait = self.consume()
+        while wait > 0:
+            sleep(wait)
+            wait = self.consume()
+
+    def pause(self, sec: float):
+        """Empty the bucket so that no token is given for sec seconds."""
+        with self._lock:
+            self._tokens = -sec * self.rate
+            self._updated = monotonic()
+
+    def is_full(self) -> bool:
+        """Whether the bucket is refilled to capacity, i.e. it holds no state worth keeping."""
+        with self._lock:
+            return self._tokens + (monotonic() - self._updated) * self.rate >= self.capacity
+
+
+class _Request:
+    __slots__ = ('method', 'payload', 'chat_id', 'future', 'attempt')
+
+    def __init__(self, method: str, payload: Dict, chat_id: Optional[str], future: Future):
+        self.method = method
+        self.payload = payload
+        self.chat_id = chat_id
+        self.future = future
+        self.attempt = 0
+
+
+class TelegramSender:
+    def __init__(self,
+                 webhook_domain: str,
+                 lanes: int = 4,
+                 global_rate: float = 30,
+                 chat_rate: float = 1,
+                 chat_burst: float = 3,
+                 max_retries: int = 3,
+                 timeout: float = 10):
+        """
+        Asynchronous sender for telegram bot api.
+        Requests are sent from background lanes over keep-alive connections.
+        Requests of a chat are sent one at a time in order. A chat over its rate or waiting for a retry
+        is put back in schedule, so that lanes send for other chats meanwhile.
+
+        :param webhook_domain: '{SEND_URL}{API_TOKEN}' of the bot.
+        :param lanes: number of background sending threads.
+        :param global_rate: messages per second for the whole bot.
+        :param chat_rate: messages per second for a chat.
+        :param chat_burst: messages a chat can send at once before chat_rate applies.
+        :param max_retries: retries of a request answered with 429 or failed by connection.
+        :param timeout: seconds of http timeout.
+        """
+        self.webhook_domain = webhook_domain
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=lanes))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=lanes))
+
+        self.global_bucket = TokenBucket(rate=global_rate, capacity=global_rate)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._chats: Dict[str, Deque[_Request]] = {}  # key -> requests waiting, while scheduled or in flight
+        self._ready: List[Tuple[float, int, str]] = []  # heap of (monotonic time to send, seq, key)
+        self._seq = itertools.count()
+        self._unfinished = 0
+        self._swept_at = monotonic()
+        self._cond = threading.Condition()
+        for i in range(lanes):
+            threading.Thread(target=self._work, name=f'telegram-sender-{i}', daemon=True).start()
+
+    def request(self, method: str, payload: Dict, chat_id: str = None) -> Future:
+        """
+        Queue a bot api call and Return Future of its 'result'.
+        Calls with chat_id are rate limited and ordered by chat.
+        """
+        future = Future()
+        key = str(chat_id) if chat_id is not None else f'_{next(self._seq)}'  # Calls without chat are not ordered
+        with self._cond:
+            self._unfinished += 1
+            requests_of_chat = self._chats.get(key)
+            if requests_of_chat is None:  # Chat is idle
+                requests_of_chat = self._chats[key] = deque()
+                self._schedule(key, 0)
+            requests_of_chat.append(_Request(method, payload, chat_id, future))
+        return future
+
+    def send_message(self, chat_id: str, text: str, **kwargs) -> Future:
+        return self.request('sendMessage', {'chat_id': chat_id, 'text': text, **kwargs}, chat_id=chat_id)
+
+    def flush(self, timeout: float = None):
+        """Block until every queued request is sent."""
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            while self._unfinished:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return
+                self._cond.wait(remaining)
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate=self.chat_rate, capacity=self.chat_burst)
+        return bucket
+
+    def _schedule(self, key: str, delay: float):
+        heapq.heappush(self._ready, (monotonic() + delay, next(self._seq), key))
+        self._cond.notify_all()
+
+    def _next(self) -> Tuple[str, _Request]:
+        """Block until a chat is due, and Take its next request. A chat over its rate is scheduled again."""
+        with self._cond:
+            while True:
+                self._sweep()
+                if not self._ready:
+                    self._cond.wait(BUCKET_SWEEP_INTERVAL)
+                    continue
+                send_at, _, key = self._ready[0]
+                wait = send_at - monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._ready)
+
+                request = self._chats[key][0]
+                if request.chat_id is not None:
+                    wait = self._chat_bucket(key).consume()
+                    if wait > 0:
+                        self._schedule(key, wait)
+                        continue
+                return key, self._chats[key].popleft()
+
+    def _done(self, key: str, request: _Request, retry_after: Optional[float]):
+        with self._cond:
+            requests_of_chat = self._chats[key]
+            if retry_after is not None:  # Send it again first, after other chats
+                request.attempt += 1
+                requests_of_chat.appendleft(request)
+                self._schedule(key, retry_after)
+                return
+            self._unfinished -= 1
+            if requests_of_chat:
+                self._schedule(key, 0)
+            else:
+                del self._chats[key]
+                self._cond.notify_all()
+
+    def _sweep(self):
+        """Evict buckets of idle chats refilled to capacity, so that they do not pile up."""
+        now = monotonic()
+        if now - self._swept_at < BUCKET_SWEEP_INTERVAL:
+            return
+        self._swept_at = now
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items()
+                        if chat_id not in self._chats and bucket.is_full()]:
+            del self._chat_buckets[chat_id]
+
+    def _work(self):
+        while True:
+            key, request = self._next()
+            retry_after = None
+            try:
+                retry_after = self._send(request)
+            except Exception as e:
+                LOGGER.error(f'Error occurred while calling telegram {request.method}. > {e}')
+                request.future.set_exception(e)
+            finally:
+                self._done(key, request, retry_after)
+
+    def _send(self, request: _Request) -> Optional[float]:
+        """Call the api once and Set result of request. Return seconds to wait before a retry instead, if any."""
+        method = request.method
+        self.global_bucket.acquire()
+        try:
+            with TELEGRAM_SEND_LATENCY.time(method=method):
+                response = self.session.post(
+                    f'{self.webhook_domain}/{method}', json=request.payload, timeout=self.timeout)
+            result_json = response.json()
+        except (RequestException, ValueError) as e:
+            TELEGRAM_SEND_ERRORS.inc(method=method, reason=type(e).__name__)
+            if request.attempt >= self.max_retries:
+                raise
+            LOGGER.warning(f'Telegram {method} failed, retry. > {e}')
+            return 2 ** request.attempt
+
+        if response.status_code == 429:
+            TELEGRAM_SEND_ERRORS.inc(method=method, reason='429')
+            retry_after = (result_json.get('parameters') or {}).get('retry_after', 1)
+            LOGGER.warning(f'Telegram {method} rate limited. retry after {retry_after} seconds.')
+            if request.chat_id is None:
+                self.global_bucket.pause(retry_after)
+            if request.attempt >= self.max_retries:
+                raise TelegramApiError(method, 'Too many retries.')
+            return retry_after
+
+        if not result_json.get('ok'):
+            TELEGRAM_SEND_ERRORS.inc(method=method, reason=str(response.status_code))
+            raise TelegramApiError(method, result_json.get('description', response.text))
+        request.future.set_result(result_json.get('result'))
+        return None
+
+
+def get_sender(webhook_domain: str) -> TelegramSender:
+    """Return process-wide sender of webhook_domain."""
+    sender = _SENDERS.get(webhook_domain)
+    if sender is None:
+        with _SENDERS_LOCK:
+            sender = _SENDERS.get(webhook_domain)
+            if sender is None:
+                sender = _SENDERS[webhook_domain] = TelegramSender(
+                    webhook_domain,
+                    lanes=RESERV_CONF.get('telegram.sender.lanes') or 4,
+                    global_rate=RESERV_CONF.get('telegram.sender.global_rate') or 30,
+                    chat_rate=RESERV_CONF.get('telegram.sender.chat_rate') or 1,
+                    chat_burst=RESERV_CONF.get('telegram.sender.chat_burst') or 3,
+                )
+    return sender
+
+
+def flush_senders(timeout: float = None):
+    """Block until every sender sent its queued requests."""
+    for sender in list(_SENDERS.values()):
+        sender.flush(timeout=timeout)
+
+
+class ProgressReporter:
+    def __init__(self, sender: TelegramSender, chat_id: str, min_interval: float = 3):
+        """
+        Report progress of a long job as a single chat message updated in place.
+        The first update posts the message and later ones edit it by editMessageText.
+        Edits are throttled to min_interval, and only the latest text is sent when updates pile up.
+        If the first message fails, reporting stops rather than posting a new message for every update.
+
+        :param sender: sender of the bot.
+        :param chat_id: chat to report.
+        :param min_interval: minimum seconds between edits.
+        """
+        self.sender = sender
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.message_id: Optional[int] = None
+
+        self._lock = threading.RLock()
+        self._closed = False
+        self._failed = False
+        self._pending: Optional[str] = None
+        self._sent_text: Optional[str] = None
+        self._sent_at = 0.0
+        self._in_flight: Optional[Future] = None
+        self._timer: Optional[threading.Timer] = None
+
+    def update(self, text: str):
+        """Set latest progress text. It is sent now or after min_interval."""
+        with self._lock:
+            self._pending = text
+            self._schedule()
+
+    def close(self, timeout: float = 10):
+        """Send the latest pending text at once and Wait until it is sent."""
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        in_flight = self._in_flight
+        if in_flight is not None:
+            self._wait(in_flight, timeout)
+        with self._lock:
+            future = self._send()
+        if future is not None:
+            self._wait(future, timeout)
+
+    def _schedule(self):
+        if self._closed or self._in_flight is not None or self._timer is not None or self._pending is None:
+            return
+        delay = self._sent_at + self.min_interval - monotonic()
+        if self.message_id is None or delay <= 0:
+            self._send()
+        else:
+            self._timer = threading.Timer(delay, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._schedule()
+
+    def _send(self) -> Optional[Future]:
+        text, self._pending = self._pending, None
+        if self._failed or text is None or text == self._sent_text:
+            return None
+
+        if self.message_id is None:
+            future = self.sender.send_message(self.chat_id, text)
+        else:
+            future = self.sender.request(
+                'editMessageText',
+                {'chat_id': self.chat_id, 'message_id': self.message_id, 'text': text},
+                chat_id=self.chat_id,
+            )
+        self._sent_text, self._sent_at, self._in_flight = text, monotonic(), future
+        future.add_done_callback(self._on_sent)
+        return future
+
+    def _on_sent(self, future: Future):
+        with self._lock:
+            self._in_flight = None
+            if self.message_id is None:
+                if future.cancelled() or future.exception() is not None:
+                    LOGGER.warning(f'[{self.chat_id}] Progress message is not posted, stop reporting progress.')
+                    self._failed = True
+                    return
+                self.message_id = (future.result() or {}).get('message_id')
+            self._schedule()
+
+    @staticmethod
+    def _wait(future: Future, timeout: float):
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            LOGGER.error(f'Error occurred while reporting progress. > {e}')
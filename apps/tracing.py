@@ -0,0 +1,172 @@
+"""
+Namu's lightweight run tracing.
+A trace is a tree of spans, 'phase' spans grouping 'call' spans, exported as json per run.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from time import time, monotonic
+from typing import Dict, List, Optional, Union
+from uuid import uuid4
+
+
+class Span:
+    __slots__ = ('name', 'kind', 'attrs', 'start', 'end', 'outcome', 'children')
+
+    def __init__(self, name: str, kind: str, attrs: Dict, start: float):
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+        self.start = start
+        self.end: Optional[float] = None
+        self.outcome = 'ok'
+        self.children: List['Span'] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else monotonic()) - self.start
+
+    def to_dict(self, origin: float) -> Dict:
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'attrs': self.attrs,
+            'start': round(self.start - origin, 6),
+            'duration': round(self.duration, 6),
+            'outcome': self.outcome,
+            'children': [child.to_dict(origin) for child in self.children],
+        }
+
+
+class _NullSpan:
+    """Context of a span not recorded."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    def __init__(self, **attrs):
+        """
+        Trace of a run, e.g. a reservation run of a telegram update.
+        Spans opened in another thread are nested under the latest phase.
+        A thread opening phases of its own records into branch() instead, since the latest phase is shared.
+
+        :param attrs: attributes of the run, e.g. update_id and chat_id.
+        """
+        self.id = uuid4().hex
+        self.attrs = attrs
+        self.started_at = time()
+        self.root = Span('run', 'run', {}, monotonic())
+        self._last_phase = self.root
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = [self._last_phase]
+        return stack
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'call', **attrs):
+        """Record the with block as a span under the current one. Outcome is the exception name if raised."""
+        stack = self._stack()
+        parent, span = stack[-1], Span(name, kind, attrs, monotonic())
+        with self._lock:
+            parent.children.append(span)
+        stack.append(span)
+        if kind == 'phase':
+            self._last_phase = span
+        try:
+            yield span
+        except BaseException as e:
+            span.outcome = type(e).__name__
+            raise
+        finally:
+            span.end = monotonic()
+            stack.pop()
+            if kind == 'phase':
+                self._last_phase = parent
+
+    def phase(self, name: str, **attrs):
+        return self.span(name, kind='phase', **attrs)
+
+    def branch(self, name: str, **attrs) -> 'Trace':
+        """
+        Return trace of another thread recording under a new phase span of the current span, e.g. a helper browser.
+        The phase ends by finish() of the branch.
+        """
+        stack, span = self._stack(), Span(name, 'phase', attrs, monotonic())
+        with self._lock:
+            stack[-1].children.append(span)
+
+        branch = Trace(**self.attrs)
+        branch.id, branch.started_at = self.id, self.started_at
+        branch.root = branch._last_phase = span
+        branch._lock = self._lock
+        return branch
+
+    def finish(self):
+        self.root.end = monotonic()
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        Return breakdown by phase name. Time of a phase excludes its nested phases.
+        Calls outside of any phase are summarized as 'run'.
+        """
+        summary: Dict[str, Dict] = {}
+
+        def _visit(span: Span):
+            phases = [child for child in span.children if child.kind == 'phase']
+            calls = [child for child in span.children if child.kind == 'call']
+            entry = summary.setdefault(span.name, {'count': 0, 'seconds': 0.0, 'call_count': 0, 'calls': {}})
+            entry['count'] += 1
+            entry['seconds'] += span.duration - sum(phase.duration for phase in phases)
+            entry['call_count'] += len(calls)
+            for call in calls:
+                count, seconds = entry['calls'].get(call.name, (0, 0.0))
+                entry['calls'][call.name] = (count + 1, seconds + call.duration)
+            for phase in phases:
+                _visit(phase)
+
+        _visit(self.root)
+        return summary
+
+    def format_summary(self) -> str:
+        lines = [f'trace {self.id} {self.attrs} {self.root.duration:.3f}s']
+        for name, entry in sorted(self.summary().items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f'  {name:<10} x{entry["count"]:<4} {entry["seconds"]:8.3f}s  calls {entry["call_count"]}')
+            for call, (count, seconds) in sorted(entry['calls'].items(), key=lambda item: -item[1][1])[:5]:
+                lines.append(f'    {call:<28} x{count:<5} {seconds:8.3f}s')
+        return '\n'.join(lines)
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'attrs': self.attrs,
+            'started_at': self.started_at,
+            'duration': round(self.root.duration, 6),
+            'summary': self.summary(),
+            'spans': self.root.to_dict(self.root.start),
+        }
+
+    def export(self, directory: Union[str, Path]) -> Path:
+        """Write trace as json into directory and Return the file path."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        started = datetime.fromtimestamp(self.started_at).strftime('%Y%m%d-%H%M%S')
+        path = directory / f'{started}-{self.attrs.get("chat_id", "run")}-{self.id[:8]}.json'
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, default=str)
+        return path
@@ -0,0 +1,109 @@
+"""
+Reservation worker entrypoint.
+It executes bot commands enqueued by the webhook api, apart from the web server.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+
+    $ python -m apps.worker --processes 2
+"""
+
+import argparse
+import logging
+import multiprocessing
+import signal
+import socket
+from time import sleep
+from typing import List
+
+from apps.logginglib import set_logger, stop_queue_logging
+from apps.reservation.db.redis.job_queue import JobQueue
+from apps.reservation.db.redis.lease import RedisLease
+from apps.reservation.reservationbot import ReservationBot
+from apps.reservation.yeyak import get_yeyak_pool
+from apps.telegramlib import flush_senders
+
+
+LOGGER = logging.getLogger(__name__)
+ALIVE_TTL = 30  # seconds until jobs of a silent worker are recovered by the leader
+
+
+class ReservationWorker:
+    def __init__(self, worker_id: str):
+        """Consume reservation jobs one by one until stop() is called."""
+        self.worker_id = worker_id
+        self.queue = JobQueue(worker_id=worker_id)
+        self._running = False
+
+    def run(self):
+        self._running = True
+
+        # Mark alive, so that the leader does not recover jobs of this worker. A crashed one may hold it still.
+        alive = RedisLease(self.queue.alive_name, ttl=ALIVE_TTL)
+        if not alive.acquire():
+            LOGGER.info(f'[WORKER] {self.worker_id} waits until its previous run expires.')
+            while self._running and not alive.acquire():
+                sleep(1)
+        if not self._running:
+            return
+        self.queue.recover()
+        self.queue.recover_orphans()  # e.g. workers gone by fewer --processes, without a web app leader
+        get_yeyak_pool().warm_up()
+        LOGGER.info(f'[WORKER] {self.worker_id} started.')
+
+        try:
+            while self._running:
+                job = self.queue.dequeue(timeout=5)
+                if job is None:
+                    continue
+                try:
+                    bot = ReservationBot(telegram_info=job.payload)
+                    bot.action_by_step()
+                except Exception:
+                    LOGGER.exception(f'[WORKER] Job {job.id} failed.')
+                finally:
+                    self.queue.ack(job)
+        finally:
+            get_yeyak_pool().close()
+            flush_senders(timeout=30)
+            alive.release()
+            LOGGER.info(f'[WORKER] {self.worker_id} stopped.')
+
+    def stop(self, *args):
+        """Finish the current job and Stop."""
+        self._running = False
+
+
+def _run_process(worker_id: str):
+    set_logger()
+    worker = ReservationWorker(worker_id)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    try:
+        worker.run()
+    finally:
+        stop_queue_logging()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run reservation workers.')
+    parser.add_argument('--processes', type=int, default=1, help='number of worker processes')
+    args = parser.parse_args()
+
+    hostname = socket.gethostname()
+    processes: List[multiprocessing.Process] = [
+        multiprocessing.Process(target=_run_process, args=(f'{hostname}-{i}',), name=f'reservation-worker-{i}')
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def _terminate(*_):
+        for p in processes:
+            p.terminate()  # Workers stop after the current job
+    signal.signal(signal.SIGTERM, _terminate)
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
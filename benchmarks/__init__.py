@@ -0,0 +1,6 @@
+"""
+Benchmarks of namu-bot.
+Each module runs as a script against the services configured in conf.d/namu-bot.yaml.
+
+    $ python -m benchmarks.<module>
+"""
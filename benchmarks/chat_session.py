@@ -0,0 +1,88 @@
+"""
+Microbenchmark of redis round trips made by chat session handling per telegram update.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+
+    $ python -m benchmarks.chat_session --repeat 100
+"""
+
+import argparse
+import functools
+from time import perf_counter
+from typing import Dict, Callable
+
+from redis.connection import Connection
+
+from apps.reservation.db.redis import REDIS
+from apps.reservation.reservationbot import ReservationBot
+
+
+class RoundTripCounter:
+    def __init__(self):
+        """Count packed commands sent to redis. A pipeline or script call counts as one round trip."""
+        self.count = 0
+        self._send = Connection.send_packed_command
+
+    def __enter__(self):
+        counter, send = self, self._send
+
+        @functools.wraps(send)
+        def _counting_send(connection, command, *args, **kwargs):
+            counter.count += 1
+            return send(connection, command, *args, **kwargs)
+
+        Connection.send_packed_command = _counting_send
+        return self
+
+    def __exit__(self, *exc):
+        Connection.send_packed_command = self._send
+
+
+def _chat(chat_id: int) -> Dict:
+    return {'id': chat_id, 'last_name': 'bench', 'first_name': f'user{chat_id}'}
+
+
+def message_update(update_id: int, chat_id: int, text: str = 'hello') -> Dict:
+    return {'update_id': update_id, 'message': {'chat': _chat(chat_id), 'text': text}}
+
+
+def disconnect_update(update_id: int, chat_id: int) -> Dict:
+    return {
+        'update_id': update_id,
+        'my_chat_member': {'chat': _chat(chat_id), 'old_chat_member': {'status': 'member'}},
+    }
+
+
+def measure(name: str, make_update: Callable[[int], Dict], repeat: int, before: Callable[[int], None] = None):
+    round_trips, elapsed = 0, 0.0
+    for i in range(repeat):
+        if before is not None:
+            before(i)
+        with RoundTripCounter() as counter:
+            started = perf_counter()
+            ReservationBot(telegram_info=make_update(i))
+            elapsed += perf_counter() - started
+        round_trips += counter.count
+    print(f'{name:<24} round trips/update: {round_trips / repeat:5.2f}   '
+          f'latency/update: {elapsed / repeat * 1000:7.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count redis round trips of chat session per update.')
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--chat-id-base', type=int, default=9_000_000_000)
+    args = parser.parse_args()
+    base = args.chat_id_base
+
+    def _clear(i):
+        REDIS.delete(f'chat_session_{base + i}')
+
+    measure('new chat message', lambda i: message_update(i, base + i), args.repeat, before=_clear)
+    measure('existing chat message', lambda i: message_update(i, base + i), args.repeat)
+    measure('disconnect', lambda i: disconnect_update(i, base + i), args.repeat)
+
+    for i in range(args.repeat):
+        _clear(i)
+
+
+if __name__ == '__main__':
+    main()
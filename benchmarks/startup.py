@@ -0,0 +1,100 @@
+"""
+Benchmark of web app startup.
+It reports import time, create_app time, heavy modules loaded at startup and time to first served request.
+Every run starts a fresh interpreter.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+
+    $ python -m benchmarks.startup --runs 5
+"""
+
+import argparse
+import json
+import socket
+import statistics
+import subprocess
+import sys
+from time import perf_counter, sleep
+
+import requests
+
+HEAVY_MODULES = ('selenium', 'pytz')
+
+# Run in a fresh interpreter, print measures as json
+IMPORT_SCRIPT = '''
+import json, sys
+from time import perf_counter
+started = perf_counter()
+import apps
+imported = perf_counter()
+apps.create_app()
+created = perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'heavy_modules': [m for m in %r if m in sys.modules],
+}))
+'''
+
+
+def measure_import() -> dict:
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_SCRIPT % (HEAVY_MODULES,)],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_request(timeout: float = 60) -> float:
+    """Seconds from spawning the server process to the first answered /health."""
+    port = _free_port()
+    started = perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.startup', '--serve', str(port)])
+    try:
+        while perf_counter() - started < timeout:
+            try:
+                if requests.get(f'http://127.0.0.1:{port}/health', timeout=1).ok:
+                    return perf_counter() - started
+            except requests.RequestException:
+                pass
+            if process.poll() is not None:
+                raise RuntimeError(f'Server exited with {process.returncode}.')
+            sleep(0.01)
+        raise TimeoutError(f'No response within {timeout} seconds.')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def serve(port: int):
+    from werkzeug.serving import make_server
+    from apps.server import app
+    make_server('127.0.0.1', port, app).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark web app startup.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    imports = [measure_import() for _ in range(args.runs)]
+    first_requests = [measure_first_request() for _ in range(args.runs)]
+    print(f'import apps:          p50 {statistics.median(m["import"] for m in imports) * 1000:8.1f} ms')
+    print(f'create_app:           p50 {statistics.median(m["create_app"] for m in imports) * 1000:8.1f} ms')
+    print(f'first served request: p50 {statistics.median(first_requests) * 1000:8.1f} ms   '
+          f'max {max(first_requests) * 1000:8.1f} ms')
+    print(f'heavy modules loaded: {imports[0]["heavy_modules"] or "none"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Local stand-in of telegram bot api for benchmarks.
+It answers the methods namu-bot calls, records them and can inject latency and 429 responses.
+Webhook state is kept for getWebhookInfo, and updates pushed by push_update() are served by getUpdates.
+Point 'telegram.webhook.SEND_URL' to it, e.g. 'http://127.0.0.1:5056/bot'.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+
+    $ python -m benchmarks.telegram_api --port 5056 --latency 0.05 --error-rate 0.01
+"""
+
+import argparse
+import random
+import threading
+from collections import Counter
+from time import sleep, time
+from typing import Dict, List
+
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+
+class FakeTelegramApi:
+    def __init__(self, latency: float = 0, error_rate: float = 0, retry_after: int = 1):
+        """
+        Fake telegram bot api.
+
+        :param latency: seconds to delay every response.
+        :param error_rate: ratio of sendMessage and editMessageText answered with 429.
+        :param retry_after: 'retry_after' of 429 responses.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls: List[Dict] = []
+        self.webhook_url = ''
+        self.updates: List[Dict] = []  # pending updates of getUpdates
+        self._message_id = 0
+        self._update_id = 0
+        self._lock = threading.Lock()
+        self._updates_cond = threading.Condition(self._lock)
+        self.app = self._create_app()
+        self._server = None
+
+    def start(self, host: str = '127.0.0.1', port: int = 5056) -> str:
+        """Serve in a background thread and Return value of 'telegram.webhook.SEND_URL'."""
+        self._server = make_server(host, port, self.app, threaded=True)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f'http://{host}:{port}/bot'
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def push_update(self, update: Dict) -> int:
+        """Queue update for getUpdates with a new 'update_id' and Return it."""
+        with self._updates_cond:
+            self._update_id += 1
+            self.updates.append({**update, 'update_id': self._update_id})
+            self._updates_cond.notify_all()
+            return self._update_id
+
+    def _get_updates(self, offset: int, limit: int, timeout: float) -> List[Dict]:
+        """Confirm updates before offset and Return pending ones, waiting up to timeout seconds for any."""
+        with self._updates_cond:
+            self.updates = [update for update in self.updates if update['update_id'] >= offset]
+            if not self.updates and timeout > 0:
+                self._updates_cond.wait(timeout)
+                self.updates = [update for update in self.updates if update['update_id'] >= offset]
+            return self.updates[:limit]
+
+    def stats(self) -> Dict:
+        """Return answered calls counted by method, and 429 responses as 'throttled'."""
+        with self._lock:
+            counts = Counter(call['method'] for call in self.calls if not call['throttled'])
+            counts['throttled'] = sum(1 for call in self.calls if call['throttled'])
+        return dict(counts)
+
+    def _record(self, method: str, payload: Dict, throttled: bool):
+        with self._lock:
+            self.calls.append({'method': method, 'payload': payload, 'throttled': throttled, 'at': time()})
+
+    def _next_message(self, payload: Dict) -> Dict:
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+        return {
+            'message_id': payload.get('message_id') or message_id,
+            'chat': {'id': payload.get('chat_id')},
+            'date': int(time()),
+            'text': payload.get('text'),
+        }
+
+    def _create_app(self) -> Flask:
+        app = Flask(__name__)
+
+        @app.route('/bot<token>/<method>', methods=['GET', 'POST'])
+        def call(token, method):
+            payload = {**request.args.to_dict(), **(request.get_json(silent=True) or {})}
+            if self.latency:
+                sleep(self.latency)
+
+            if method in ('sendMessage', 'editMessageText'):
+                if self.error_rate and random.random() < self.error_rate:
+                    self._record(method, payload, throttled=True)
+                    return jsonify(ok=False, error_code=429,
+                                   description=f'Too Many Requests: retry after {self.retry_after}',
+                                   parameters={'retry_after': self.retry_after}), 429
+                self._record(method, payload, throttled=False)
+                return jsonify(ok=True, result=self._next_message(payload))
+
+            self._record(method, payload, throttled=False)
+            if method == 'setWebhook':
+                self.webhook_url = payload.get('url') or ''
+                return jsonify(ok=True, result=True, description='Webhook was set')
+            if method == 'deleteWebhook':
+                self.webhook_url = ''
+                return jsonify(ok=True, result=True, description='Webhook was deleted')
+            if method == 'getWebhookInfo':
+                return jsonify(ok=True, result={
+                    'url': self.webhook_url,
+                    'has_custom_certificate': False,
+                    'pending_update_count': len(self.updates),
+                })
+            if method == 'getUpdates':
+                if self.webhook_url:
+                    return jsonify(ok=False, error_code=409,
+                                   description="Conflict: can't use getUpdates method while webhook is active"), 409
+                updates = self._get_updates(
+                    offset=int(payload.get('offset') or 0),
+                    limit=int(payload.get('limit') or 100),
+                    timeout=float(payload.get('timeout') or 0),
+                )
+                return jsonify(ok=True, result=updates)
+            return jsonify(ok=False, error_code=404, description='Not Found: method not found'), 404
+
+        @app.route('/_stats')
+        def stats():
+            return jsonify(self.stats())
+
+        @app.route('/_reset', methods=['POST'])
+        def reset():
+            self.reset()
+            return jsonify(ok=True)
+
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve fake telegram bot api.')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--latency', type=float, default=0, help='seconds to delay every response')
+    parser.add_argument('--error-rate', type=float, default=0, help='ratio of messages answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+
+    api = FakeTelegramApi(latency=args.latency, error_rate=args.error_rate, retry_after=args.retry_after)
+    api.app.run(port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Load generator of telegram webhook updates for 'POST /reservation'.
+It reports ingress latency, throughput, redis ops and outbound messages per update.
+Run the app with 'telegram.webhook.SEND_URL' pointing to benchmarks.telegram_api.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+
+    $ python -m benchmarks.telegram_api --port 5056 &
+    $ python -m benchmarks.webhook_load --updates 2000 --rate 200 --concurrency 32
+    $ python -m benchmarks.webhook_load --replay updates.jsonl
+"""
+
+import argparse
+import json
+import random
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+from typing import Dict, List, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from apps.reservation.db.redis import REDIS
+from benchmarks.chat_session import message_update, disconnect_update
+
+# Default mix of synthetic updates, commands which engage browsers are left out
+UPDATE_MIX = (
+    ('message', 0.6),
+    ('/start', 0.15),
+    ('/status', 0.15),
+    ('my_chat_member', 0.1),
+)
+
+
+def command_update(update_id: int, chat_id: int, command: str) -> Dict:
+    """Message update parsed as a bot command, e.g. '/start'."""
+    update = message_update(update_id, chat_id, text=command)
+    update['message']['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+    return update
+
+
+def synthetic_updates(count: int, chats: int, base: int) -> Iterator[Dict]:
+    kinds, weights = zip(*UPDATE_MIX)
+    for i in range(count):
+        update_id, chat_id = base + i, base + random.randrange(chats)
+        kind = random.choices(kinds, weights)[0]
+        if kind == 'my_chat_member':
+            yield disconnect_update(update_id, chat_id)
+        elif kind == 'message':
+            yield message_update(update_id, chat_id)
+        else:
+            yield command_update(update_id, chat_id, kind)
+
+
+def recorded_updates(path: str, base: int) -> Iterator[Dict]:
+    """Read a update per line. update_id is renumbered so that replays are not dropped as duplicates."""
+    with open(path, encoding='utf-8') as f:
+        for i, line in enumerate(line for line in f if line.strip()):
+            yield {**json.loads(line), 'update_id': base + i}
+
+
+def redis_ops() -> int:
+    """Total commands processed by redis except INFO itself."""
+    return sum(stat['calls'] for name, stat in REDIS.info('commandstats').items() if name != 'cmdstat_info')
+
+
+def api_stats(api_url: Optional[str], reset: bool = False) -> Dict:
+    if not api_url:
+        return {}
+    if reset:
+        requests.post(f'{api_url}/_reset', timeout=5)
+        return {}
+    return requests.get(f'{api_url}/_stats', timeout=5).json()
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive telegram webhook updates to the app.')
+    parser.add_argument('--app-url', default='http://127.0.0.1:5000/reservation')
+    parser.add_argument('--api-url', default='http://127.0.0.1:5056', help='benchmarks.telegram_api, empty to skip')
+    parser.add_argument('--updates', type=int, default=1000)
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=0, help='updates per second, 0 sends as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--replay', help='jsonl file of recorded updates')
+    parser.add_argument('--settle', type=float, default=3, help='seconds to wait for outbound messages')
+    parser.add_argument('--base', type=int, default=8_000_000_000, help='first update_id and chat_id')
+    args = parser.parse_args()
+
+    updates = list(recorded_updates(args.replay, args.base) if args.replay
+                   else synthetic_updates(args.updates, args.chats, args.base))
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_maxsize=args.concurrency))
+    latencies: List[float] = []
+    errors = 0
+
+    def _post(update: Dict):
+        started = perf_counter()
+        response = session.post(args.app_url, json=update, timeout=30)
+        return perf_counter() - started, response.status_code
+
+    api_stats(args.api_url, reset=True)
+    ops_before = redis_ops()
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = []
+        for i, update in enumerate(updates):
+            if args.rate:
+                delay = started + i / args.rate - perf_counter()
+                if delay > 0:
+                    sleep(delay)
+            futures.append(executor.submit(_post, update))
+        for future in futures:
+            try:
+                latency, status_code = future.result()
+            except requests.RequestException as e:  # e.g. connection refused or reset under load
+                errors += 1
+                print(f'request failed. > {e}')
+                continue
+            latencies.append(latency)
+            errors += status_code >= 400
+    elapsed = perf_counter() - started
+
+    sleep(args.settle)  # Let background sends and jobs finish
+    ops = redis_ops() - ops_before
+    outbound = api_stats(args.api_url)
+    total = len(updates)
+
+    print(f'updates: {total}   errors: {errors}   throughput: {total / elapsed:8.1f} updates/s')
+    if latencies:
+        print(f'ingress latency: p50 {statistics.median(latencies) * 1000:7.2f} ms   '
+              f'p99 {percentile(latencies, 0.99) * 1000:7.2f} ms   max {max(latencies) * 1000:7.2f} ms')
+    print(f'redis ops/update: {ops / total:6.2f}')
+    if outbound:
+        messages = outbound.get('sendMessage', 0) + outbound.get('editMessageText', 0)
+        print(f'outbound messages/update: {messages / total:6.2f}   '
+              f'429 responses: {outbound.get("throttled", 0)}   by method: {outbound}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+End-to-end benchmark of yeyak scan against the local stand-in site of benchmarks.yeyak_site.
+It reports time-to-first-match, time-to-submit, latency and webdriver calls per scan iteration and of register.
+Site state and availability snapshots are kept in memory, so that the run does not touch redis of the bot.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+
+    $ python -m benchmarks.yeyak_scan --runs 3 --list-after 5 --slots-after 10
+    $ python -m benchmarks.yeyak_scan --mode http --facilities 300
+"""
+
+import argparse
+import functools
+import statistics
+from time import perf_counter, time
+from typing import Dict, List, Optional
+
+from apps.reservation import yeyak
+from apps.reservation.scanner import FacilityScanner, get_http_session
+from apps.reservation.db.redis.site_state import SiteState
+from apps.reservation.db.redis.snapshot import AvailabilitySnapshot
+from benchmarks.yeyak_site import YeyakSite, XPATHS
+
+
+class MemorySiteState(SiteState):
+    """SiteState kept in memory, shared by handlers of the benchmark."""
+    _states: Dict[str, List[Dict]] = {}
+
+    def save(self, cookies: List[Dict]):
+        self._states[self.name] = [dict(cookie) for cookie in cookies]
+
+    def load(self) -> Optional[List[Dict]]:
+        return self._states.get(self.name)
+
+    def delete(self):
+        self._states.pop(self.name, None)
+
+
+class MemorySnapshot(AvailabilitySnapshot):
+    """AvailabilitySnapshot kept in memory, shared by handlers of the benchmark."""
+    _records: Dict[str, tuple] = {}
+
+    def save_options(self, facility_type, options):
+        self._records[f'options_{facility_type}'] = (int(time()), options)
+
+    def load_options(self, facility_type):
+        return self._records.get(f'options_{facility_type}')
+
+    def save_calendar(self, facility_value, dates):
+        self._records[f'calendar_{facility_value}'] = (int(time()), dates)
+
+    def load_calendar(self, facility_value):
+        return self._records.get(f'calendar_{facility_value}')
+
+
+class ScanProbe:
+    def __init__(self, handler: yeyak.YeyakHandler):
+        """Record timings and webdriver calls of a yeyak run by wrapping methods of the handler instance."""
+        self.handler = handler
+        self.started = perf_counter()
+        self.first_match: Optional[float] = None
+        self.submitted: Optional[float] = None
+        self.iterations: List[float] = []  # seconds of each scan iteration
+        self.iteration_calls: List[int] = []  # webdriver calls of each scan iteration
+        self.calls = 0
+        self.register_calls: Optional[int] = None  # webdriver calls of register flow of the match
+        self._mark, self._mark_calls = self.started, 0
+
+        driver_execute = handler.driver.execute
+        save_options = handler.snapshot.save_options
+        find_slot = handler._find_slot
+        submit_slot = handler._submit_slot
+        register_facility = handler._register_facility
+
+        @functools.wraps(driver_execute)
+        def _execute(*args, **kwargs):
+            self.calls += 1
+            return driver_execute(*args, **kwargs)
+
+        @functools.wraps(save_options)
+        def _save_options(*args, **kwargs):  # called once per scan iteration
+            now = perf_counter()
+            self.iterations.append(now - self._mark)
+            self.iteration_calls.append(self.calls - self._mark_calls)
+            return save_options(*args, **kwargs)
+
+        @functools.wraps(find_slot)
+        def _find_slot(*args, **kwargs):
+            if self.first_match is None:
+                self.first_match = perf_counter() - self.started
+            return find_slot(*args, **kwargs)
+
+        @functools.wraps(submit_slot)
+        def _submit_slot(*args, **kwargs):
+            result = submit_slot(*args, **kwargs)
+            self.submitted = perf_counter() - self.started
+            return result
+
+        @functools.wraps(register_facility)
+        def _register_facility(*args, **kwargs):
+            calls = self.calls
+            try:
+                return register_facility(*args, **kwargs)
+            finally:
+                self.register_calls = (self.register_calls or 0) + self.calls - calls
+
+        handler.driver.execute = _execute
+        handler.snapshot.save_options = _save_options
+        handler._find_slot = _find_slot
+        handler._submit_slot = _submit_slot
+        handler._register_facility = _register_facility
+
+    def next_iteration(self):
+        """Start timing of the next iteration after the poll interval is slept."""
+        self._mark, self._mark_calls = perf_counter(), self.calls
+
+
+def run_once(site: YeyakSite, scanner: Optional[FacilityScanner], max_iterations: int) -> ScanProbe:
+    handler = yeyak.YeyakHandler()
+    handler.test = False  # Submit to the local site
+    probe = ScanProbe(handler)
+
+    sleep = handler.sleep
+
+    def _sleep(sec=1):
+        sleep(sec)
+        probe.next_iteration()
+    handler.sleep = _sleep
+
+    site.reset()
+    probe.started = perf_counter()
+    try:
+        for result in handler.yeyak(target=None, quarter=None, username='bench', scanner=scanner):
+            if isinstance(result, tuple) or len(probe.iterations) >= max_iterations:
+                break
+    finally:
+        handler.quit()
+    return probe
+
+
+def _ms(seconds: Optional[float]) -> str:
+    return f'{seconds * 1000:9.1f} ms' if seconds is not None else '        - ms'
+
+
+def report(mode: str, probes: List[ScanProbe], site: YeyakSite):
+    iterations = [s for p in probes for s in p.iterations]
+    calls = [c for p in probes for c in p.iteration_calls]
+    for i, probe in enumerate(probes):
+        print(f'[{mode}] run {i + 1}: first match {_ms(probe.first_match)}   submit {_ms(probe.submitted)}   '
+              f'iterations {len(probe.iterations):3d}   webdriver calls {probe.calls:5d}   '
+              f'register calls {probe.register_calls if probe.register_calls is not None else "-":>5}')
+    if iterations:
+        print(f'[{mode}] iteration latency: p50 {_ms(statistics.median(iterations))}   '
+              f'max {_ms(max(iterations))}')
+        print(f'[{mode}] webdriver calls/iteration: {statistics.mean(calls):6.2f}')
+    register_calls = [p.register_calls for p in probes if p.register_calls is not None]
+    if register_calls:
+        print(f'[{mode}] webdriver calls/register: {statistics.mean(register_calls):6.2f}')
+    print(f'[{mode}] bookings: {len(site.bookings)}   site requests: {site.requests}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark yeyak scan end-to-end against a local site.')
+    parser.add_argument('--mode', choices=('browser', 'http'), default='browser',
+                        help='poll facility list in the browser or over http by FacilityScanner')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--facilities', type=int, default=50, help='unmatched facilities listed')
+    parser.add_argument('--list-after', type=float, default=3, help='seconds until the matched facility is listed')
+    parser.add_argument('--slots-after', type=float, default=6, help='seconds until weekend slots are open')
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--max-iterations', type=int, default=60)
+    args = parser.parse_args()
+
+    site = YeyakSite(facilities=args.facilities, list_after=args.list_after, slots_after=args.slots_after)
+    base_url = site.start(port=args.port)
+
+    # Point yeyak handler to the local site, Keep its state off redis of the bot
+    yeyak.CHROME_YEYAK_CONF.update(XPATHS, url=base_url)
+    yeyak.SiteState = MemorySiteState
+    yeyak.AvailabilitySnapshot = MemorySnapshot
+    yeyak.POLL_INTERVAL = args.poll_interval
+    scanner = FacilityScanner(url=f'{base_url}facilities', session=get_http_session()) \
+        if args.mode == 'http' else None
+
+    try:
+        probes = [run_once(site, scanner, args.max_iterations) for _ in range(args.runs)]
+        report(args.mode, probes, site)
+    finally:
+        site.stop()
+
+
+if __name__ == '__main__':
+    main()
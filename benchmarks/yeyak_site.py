@@ -0,0 +1,286 @@
+"""
+Local stand-in of seoul yeyak site for benchmarks.
+It reproduces the pages and elements YeyakHandler depends on, at the same absolute xpaths.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+
+    $ python -m benchmarks.yeyak_site --port 5055 --list-after 10 --slots-after 20
+"""
+
+import argparse
+import json
+import threading
+from datetime import date, timedelta
+from time import monotonic
+from typing import Dict, List
+
+from flask import Flask, request, redirect, make_response, render_template_string, jsonify
+from werkzeug.serving import make_server
+
+
+# xpath config of 'VAL.seoul.yeyak.chrome' matching this site
+XPATHS = {
+    'xpath.lang_tit': '//*[@id="lang_tit"]',
+    'xpath.lang_kor': '//*[@id="lang_kor"]',
+    'xpath.lang_eng': '//*[@id="lang_eng"]',
+    'xpath.btn_login': '//*[@id="btn_login"]',
+    'xpath.btn_login_submit': '//*[@id="btn_login_submit"]',
+    'xpath.btn_logout': '//*[@id="btn_logout"]',
+    'xpath.input_userid': '//*[@id="userid"]',
+    'xpath.input_password': '//*[@id="userpwd"]',
+    'xpath.select_facility_type': '//*[@id="select_facility_type"]',
+    'xpath.select_facilities': '//*[@id="select_facilities"]',
+}
+MATCHED_FACILITY = ('T107-MATCH', '잠실유수지 축구장 (주말)')
+
+LAYOUT = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>yeyak</title></head>
+<body>
+<div id="wrap">
+  <div class="header">
+    <div class="lang">
+      <a id="lang_tit" href="#" onclick="document.getElementById('lang_menu').style.display='block';return false;">LANG</a>
+      <ul id="lang_menu" style="display:none">
+        <li><a id="lang_kor" href="/lang?l=ko">한국어</a></li>
+        <li><a id="lang_eng" href="/lang?l=en">English</a></li>
+      </ul>
+    </div>
+    {% if logged_in %}<a id="btn_logout" href="/logout">로그아웃</a>{% else %}<a id="btn_login" href="/login">로그인</a>{% endif %}
+  </div>
+  <div class="gnb"></div>
+  <div class="container">
+    {{ content|safe }}
+  </div>
+</div>
+{% for popup in range(popups) %}
+<div class="popup" id="popup{{ popup }}"><a class="pop_x" href="#" onclick="this.parentNode.style.display='none';return false;">X</a></div>
+{% endfor %}
+</body></html>'''
+
+HOME = '''<div class="search"><div class="search_box"><div><div>
+  <div class="sel">
+    <select id="select_facility_type" onchange="loadFacilities(this.value)">
+      <option value="">선택</option><option value="T105">테니스장</option><option value="T107">축구장</option>
+    </select>
+  </div>
+  <div class="sel">
+    <div><button type="button" onclick="location.href='/facility?value='+document.getElementById('select_facilities').value">예약하기</button></div>
+    <select id="select_facilities"><option value="">선택</option></select>
+  </div>
+</div></div></div></div>
+<script>
+function loadFacilities(code) {
+  var xhr = new XMLHttpRequest();
+  xhr.open('GET', '/facilities?code=' + code);
+  xhr.onload = function () { document.getElementById('select_facilities').innerHTML = xhr.responseText; };
+  xhr.send();
+}
+</script>'''
+
+FACILITY = '''<div class="location"></div>
+<div class="detail"><div>
+  <form></form>
+  <form>
+    <div>
+      <div class="info">{{ name }}</div>
+      <div><div><div><a href="/booking?value={{ value }}">예약하기</a><a href="/">목록</a></div></div></div>
+    </div>
+  </form>
+</div></div>'''
+
+BOOKING = '''<div class="location"></div>
+<div class="book"><div>
+  <div><form method="post" action="/submit">
+    <input type="hidden" name="value" value="{{ value }}"><input type="hidden" name="ymd" id="ymd"><input type="hidden" name="hm" id="hm">
+    <div class="book_tit">{{ name }}</div>
+    <div class="book_notice"></div>
+    <div>
+      <div class="book_info"></div>
+      <div>
+        <div><table class="tbl_cal"><tbody><tr>
+          {% for ymd in dates %}<td class="able"><a href="#" data-ymd="{{ ymd }}" onclick="showSlots('{{ ymd }}');return false;">{{ ymd[6:] }}</a></td>{% endfor %}
+        </tr></tbody></table></div>
+        <div><ul id="slots"></ul></div>
+        <div><button type="button" class="user_plus" onclick="var e=document.getElementById('users');e.value=+e.value+1;">+</button><input id="users" value="0"></div>
+        <div><p class="book_tit2"><label><input type="checkbox">신청자 정보와 동일</label></p><p class="book_tit2"><label><input type="checkbox">전체동의</label></p></div>
+        <div><table><tbody>
+          <tr><td><span><label><input type="radio" name="grp" value="p">개인</label></span><span><label><input type="radio" name="grp" value="g">단체</label></span></td></tr>
+          <tr><td><input id="grp_nm" name="grp_nm"><input id="form_email1" name="email1"><input id="form_email2" name="email2"></td></tr>
+        </tbody></table></div>
+      </div>
+      <div><div>
+        <div></div><div></div>
+        <div><button type="button" onclick="if (confirm('예약하시겠습니까?')) { this.form.submit(); }">예약하기</button></div>
+      </div></div>
+    </div>
+  </form></div>
+</div></div>
+<script>
+var SLOTS = {{ slots|safe }};
+function showSlots(ymd) {
+  document.getElementById('ymd').value = ymd;
+  var html = '';
+  (SLOTS[ymd] || []).forEach(function (hm) {
+    html += '<li class="tab-all"><a href="#" data-start-hm="' + hm + '" onclick="document.getElementById(\\'hm\\').value=\\'' + hm + '\\';return false;">' + hm + '</a></li>';
+  });
+  setTimeout(function () { document.getElementById('slots').innerHTML = html; }, {{ slot_delay_ms }});
+}
+</script>'''
+
+LOGIN = '''<div></div><div></div><div><form method="post" action="/login">
+  <input id="userid" name="userid"><input id="userpwd" name="userpwd" type="password">
+  <button id="btn_login_submit" type="submit">로그인</button>
+</form></div>'''
+
+
+class YeyakSite:
+    def __init__(self,
+                 facilities: int = 50,
+                 list_after: float = 0,
+                 slots_after: float = 0,
+                 popups: int = 2,
+                 slot_delay_ms: int = 200):
+        """
+        Fake yeyak site with availability changing over time.
+
+        :param facilities: number of unmatched options listed for a facility type.
+        :param list_after: seconds after start until the matched weekend facility is listed.
+        :param slots_after: seconds after start until weekend time slots in the wanted quarters are open.
+        :param popups: number of popups shown on facility page.
+        :param slot_delay_ms: delay of time slots shown after a date is clicked.
+        """
+        self.facilities = facilities
+        self.list_after = list_after
+        self.slots_after = slots_after
+        self.popups = popups
+        self.slot_delay_ms = slot_delay_ms
+        self.started_at = monotonic()
+        self.bookings: List[Dict] = []
+        self.requests = 0
+        self.app = self._create_app()
+        self._server = None
+
+    def reset(self):
+        """Restart availability schedule and Clear bookings."""
+        self.started_at = monotonic()
+        self.bookings.clear()
+
+    def elapsed(self) -> float:
+        return monotonic() - self.started_at
+
+    def options(self, code: str) -> List[tuple]:
+        if code != 'T107':
+            return []
+        options = [(f'T107-{i}', f'송파구 축구장 {i} (평일)') for i in range(self.facilities)]
+        if self.elapsed() >= self.list_after:
+            options.append(MATCHED_FACILITY)
+        return options
+
+    def dates(self) -> List[str]:
+        today = date.today()
+        return [(today + timedelta(days=i)).strftime('%Y%m%d') for i in range(1, 29)]
+
+    def slots(self) -> Dict[str, List[str]]:
+        is_open = self.elapsed() >= self.slots_after
+        slots = {}
+        for ymd in self.dates():
+            weekday = date(int(ymd[:4]), int(ymd[4:6]), int(ymd[6:])).weekday()
+            if weekday == 5:
+                slots[ymd] = ['08:00', '18:00', '20:00'] if is_open else ['08:00']
+            elif weekday == 6:
+                slots[ymd] = ['06:00', '10:00', '12:00'] if is_open else ['06:00']
+            else:
+                slots[ymd] = ['19:00']
+        return slots
+
+    def start(self, host: str = '127.0.0.1', port: int = 5055) -> str:
+        """Serve in a background thread and Return base url."""
+        self._server = make_server(host, port, self.app, threaded=True)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f'http://{host}:{port}/'
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _render(self, content: str, popups: int = 0, **context):
+        return render_template_string(
+            LAYOUT,
+            content=render_template_string(content, **context),
+            logged_in=request.cookies.get('session') == 'ok',
+            popups=popups,
+        )
+
+    def _create_app(self) -> Flask:
+        app = Flask(__name__)
+
+        @app.before_request
+        def count_request():
+            self.requests += 1
+
+        @app.route('/')
+        def home():
+            return self._render(HOME)
+
+        @app.route('/facilities')
+        def facilities():
+            options = self.options(request.args.get('code', ''))
+            if request.args.get('format') == 'json':
+                return jsonify(list=[{'value': v, 'text': t} for v, t in options])
+            return ''.join(['<option value="">선택</option>'] +
+                           [f'<option value="{v}">{t}</option>' for v, t in options])
+
+        @app.route('/facility')
+        def facility():
+            value = request.args.get('value', '')
+            name = dict(self.options('T107')).get(value, value)
+            return self._render(FACILITY, popups=self.popups, value=value, name=name)
+
+        @app.route('/booking')
+        def booking():
+            value = request.args.get('value', '')
+            slots = self.slots() if value == MATCHED_FACILITY[0] else {}
+            return self._render(BOOKING, value=value, name=value, dates=sorted(slots),
+                                slots=json.dumps(slots), slot_delay_ms=self.slot_delay_ms)
+
+        @app.route('/submit', methods=['POST'])
+        def submit():
+            self.bookings.append({**request.form, 'elapsed': self.elapsed()})
+            return self._render('<div></div><div></div><div><p id="done">예약 완료</p></div>')
+
+        @app.route('/login', methods=['GET', 'POST'])
+        def login():
+            if request.method == 'POST':
+                response = make_response(redirect('/'))
+                response.set_cookie('session', 'ok')
+                return response
+            return self._render(LOGIN)
+
+        @app.route('/logout')
+        def logout():
+            response = make_response(redirect('/'))
+            response.delete_cookie('session')
+            return response
+
+        @app.route('/lang')
+        def lang():
+            response = make_response(redirect('/'))
+            response.set_cookie('lang', request.args.get('l', 'ko'))
+            return response
+
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve local yeyak site.')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--facilities', type=int, default=50)
+    parser.add_argument('--list-after', type=float, default=0)
+    parser.add_argument('--slots-after', type=float, default=0)
+    args = parser.parse_args()
+
+    site = YeyakSite(facilities=args.facilities, list_after=args.list_after, slots_after=args.slots_after)
+    site.app.run(port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
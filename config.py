@@ -36,7 +36,7 @@ class Config:
             LOGGER.info(f'Load config file... -> {config_file}')
             with config_file.open(encoding='utf-8') as f:
                 try:
-                    config = yaml.safe_load(f)
+                    config = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))  # libyaml if built
                 except yaml.YAMLError as ye:
                     LOGGER.error(f'[CONFIG-ERROR][YAMLError] {config_file}')
                     raise yaml.YAMLError(f'[FILE-PATH] {config_file}') from ye
@@ -0,0 +1,28 @@
+"""
+Gunicorn config of namu-bot web server.
+Workers fork from a preloaded app, and one of them is elected leader for singleton duties.
+MAINTAINER: Ra Daesung (daesungra@gmail.com)
+
+    $ gunicorn --config gunicorn.conf.py apps.server:app
+"""
+
+import os
+import multiprocessing
+
+name = 'app'
+workers = int(os.environ.get('WEB_WORKERS') or multiprocessing.cpu_count())
+worker_class = 'gevent'
+timeout = 30
+preload_app = True  # Import and create the app once in master, workers fork quickly
+
+
+def post_fork(server, worker):
+    from apps import warm_up_browsers
+    from apps.leader import get_leader
+    warm_up_browsers()  # Browsers of a worker are its own, never started in master and shared by forks
+    get_leader().start()
+
+
+def worker_exit(server, worker):
+    from apps.leader import get_leader
+    get_leader().stop()
@@ -6,10 +6,5 @@ cd "$PJT_DIR"
 service nginx restart
 
 . ./venv/bin/activate
-# gunicorn --workers 1 --threads 8 --worker-class gevent --timeout 30 --name app app.server:app
-gunicorn --workers 1 \
-	--threads 1 \
-	--worker-class gevent \
-	--timeout 30 \
-	--name app \
-	apps.server:app
+# Workers default to cpu count, set WEB_WORKERS to override. Webhook is synced by the elected leader worker.
+gunicorn --config gunicorn.conf.py apps.server:app
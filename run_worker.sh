@@ -0,0 +1,7 @@
+#!/usr/bin/env bash
+PJT_DIR="$( cd "$( dirname "$( readlink -f "${BASH_SOURCE[0]}" )" )" && pwd )"
+export PYTHONPATH="$PJT_DIR"
+cd "$PJT_DIR"
+
+. ./venv/bin/activate
+python -m apps.worker --processes "${WORKER_PROCESSES:-1}"